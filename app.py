@@ -1,9 +1,12 @@
 """
 Main Flask Application Entry Point
 """
+import os
 from app import create_app
+from config import config
 
-app = create_app()
+# FLASK_ENV=production selects ProductionConfig (SQLite tuning, pool settings)
+app = create_app(os.environ.get('FLASK_ENV') if os.environ.get('FLASK_ENV') in config else 'default')
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8888, debug=True)
@@ -14,12 +14,22 @@ def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # Pool/connect options for the backend DATABASE_URL points at (SQLite or PostgreSQL)
+    from app.utils.database import check_sqlite_location, engine_options
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    check_sqlite_location(app)
+    
     # Initialize extensions
     db.init_app(app)
     CORS(app)
     
+    # Tune SQLite connections (WAL, busy timeout, ...) before anything connects
+    from app.utils.sqlite_tuning import apply_sqlite_pragmas
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, app.config.get('SQLITE_PRAGMAS'))
+    
     # Register blueprints
-    from app.routes import health, device, student, attendance, class_routes, frontend
+    from app.routes import health, device, student, attendance, class_routes, frontend, events
     
     # API blueprints
     app.register_blueprint(health.bp)
@@ -27,6 +37,7 @@ def create_app(config_name='default'):
     app.register_blueprint(student.bp)
     app.register_blueprint(attendance.bp)
     app.register_blueprint(class_routes.bp)
+    app.register_blueprint(events.bp)
     
     # Frontend blueprint
     app.register_blueprint(frontend.bp)
@@ -36,24 +47,11 @@ def create_app(config_name='default'):
     def inject_datetime():
         return {'datetime': datetime}
     
-    # Add sidebar stats to all templates
+    # Add sidebar stats to all templates (cached; see app/utils/stats_cache.py)
     @app.context_processor
     def inject_sidebar_stats():
-        from app.models import Student, Class, Device, Attendance
-        from app.utils.timezone import get_today_start
-        
-        total_students = Student.query.count()
-        total_classes = Class.query.filter_by(is_active=True).count()
-        total_devices = Device.query.count()
-        today_start = get_today_start()
-        today_attendance = Attendance.query.filter(Attendance.timestamp >= today_start).count()
-        
-        return {
-            'total_students': total_students,
-            'total_classes': total_classes,
-            'total_devices': total_devices,
-            'today_attendance': today_attendance
-        }
+        from app.utils.stats_cache import get_stats
+        return get_stats(app.config.get('STATS_CACHE_TTL', 30))
     
     # Add Dhaka timezone filter for templates
     @app.template_filter('dhaka_time')
@@ -73,6 +71,15 @@ def create_app(config_name='default'):
     # Create database tables
     with app.app_context():
         db.create_all()
+        # Bring existing databases up to the current schema (columns, indexes)
+        from app.migrations import run_migrations
+        run_migrations(db.engine)
+        # Write buffered device heartbeats on shutdown
+        from app.utils.heartbeats import register_heartbeat_flush
+        register_heartbeat_flush(app)
+        # Mark absentees and close open entries as class sessions end
+        from app.utils.absences import register_absence_job
+        register_absence_job(app)
         # Initialize default data
         from app.models import Device
         if not Device.query.filter_by(device_id='ESP32-01').first():
@@ -0,0 +1,217 @@
+"""
+Fingerprint matching engines
+
+The backend is selected with ``MATCHER_BACKEND`` in config.py. One matcher
+instance per process holds the enrolled template gallery; it is loaded on
+first use and kept current by the routes that store or delete templates.
+Other worker processes change the students table too, so at most every
+``MATCHER_STALE_CHECK_SECONDS`` a scan compares ``gallery_version()`` with
+the version the gallery was loaded at and reloads it when they differ.
+
+The gallery is loaded from a memory-mapped snapshot file if it still
+matches the students table, and only rebuilt from the template BLOBs when it
+doesn't (see snapshot.py). The file sits next to a SQLite database and is
+named after the database URL otherwise, so test and alternate databases never
+share production's snapshot; ``MATCHER_SNAPSHOT_PATH`` overrides the path
+and an empty string disables it.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.engine import make_url
+from app.matching.base import Matcher, Candidate, TEMPLATE_SIZE
+from app.matching.byte_equality import ByteEqualityMatcher
+from app.matching.snapshot import GallerySnapshot
+
+MATCHERS = {
+    ByteEqualityMatcher.name: ByteEqualityMatcher,
+}
+
+_matcher = None
+_matcher_lock = threading.Lock()
+_loaded_version = None  # gallery_version() the loaded gallery matches, None if unknown
+_checked_at = 0.0  # time.monotonic() of the last staleness check
+
+
+def create_matcher(backend='byte_equality', **options):
+    """Instantiate a matcher backend by name"""
+    try:
+        matcher_cls = MATCHERS[backend]
+    except KeyError:
+        raise ValueError(f'Unknown matcher backend: {backend}')
+    return matcher_cls(**options)
+
+
+def get_matcher():
+    """Return this process's matcher, loading the gallery on first use and reloading it when stale"""
+    global _matcher, _loaded_version, _checked_at
+    from flask import current_app
+
+    config = current_app.config
+    interval = config.get('MATCHER_STALE_CHECK_SECONDS', 2)
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                matcher = create_matcher(
+                    config.get('MATCHER_BACKEND', 'byte_equality'),
+                    threshold=config.get('MATCH_THRESHOLD', 40),
+                    **config.get('MATCHER_OPTIONS', {})
+                )
+                _loaded_version = _load_gallery(matcher)
+                _checked_at = time.monotonic()
+                _matcher = matcher
+    elif time.monotonic() - _checked_at >= interval:
+        with _matcher_lock:
+            # Another thread may have checked while this one waited for the lock
+            if _matcher is not None and time.monotonic() - _checked_at >= interval:
+                _checked_at = time.monotonic()
+                if gallery_version() != _loaded_version:
+                    _loaded_version = _load_gallery(_matcher)
+    return _matcher
+
+
+def _load_gallery(matcher):
+    """Fill a matcher from the snapshot if it is current, otherwise from the DB
+
+    Returns the gallery_version() read before loading; a change made while
+    loading shows up as a newer version at the next check.
+    """
+    from app.models import Student
+
+    snapshot = get_snapshot()
+    count, stamp = gallery_version()
+    if snapshot is not None:
+        arrays = snapshot.load(count, stamp)
+        if arrays is not None:
+            matcher.load_matrix(*arrays)
+            return count, stamp
+
+    rows = Student.query.with_entities(
+        Student.id, Student.fingerprint_template
+    ).filter(Student.fingerprint_template.isnot(None)).all()
+    matcher.load(rows)
+
+    if snapshot is not None:
+        snapshot.write(*matcher.export(), stamp)
+    return count, stamp
+
+
+def gallery_version():
+    """(enrolled template count, latest updated_at stamp) used to validate snapshots"""
+    from app import db
+    from app.models import Student
+
+    count, latest = db.session.query(
+        db.func.count(Student.id), db.func.max(Student.updated_at)
+    ).filter(Student.fingerprint_template.isnot(None)).one()
+    return count, _stamp(latest)
+
+
+def _stamp(updated_at):
+    if updated_at is None:
+        return 0
+    return int((updated_at - datetime(1970, 1, 1)).total_seconds() * 1_000_000)
+
+
+def _changed_since(student_id):
+    """Check for the snapshot: did another enrolled template change after a stamp?"""
+    def changed_since(stamp):
+        from app import db
+        from app.models import Student
+
+        return db.session.query(Student.id).filter(
+            Student.fingerprint_template.isnot(None),
+            Student.updated_at > datetime(1970, 1, 1) + timedelta(microseconds=stamp),
+            Student.id != student_id
+        ).first() is not None
+    return changed_since
+
+
+def snapshot_path(database_uri):
+    """Default snapshot path for a database: beside a SQLite file, else named after the URL
+
+    None for in-memory SQLite, whose gallery doesn't outlive the process.
+    """
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite':
+        if not url.database or url.database == ':memory:':
+            return None
+        return os.path.splitext(url.database)[0] + '.gallery.bin'
+    digest = hashlib.sha1(url.render_as_string(hide_password=True).encode()).hexdigest()[:12]
+    return f'template_gallery-{digest}.bin'
+
+
+def get_snapshot():
+    """Snapshot for the configured or derived path (relative to the instance folder), or None"""
+    from flask import current_app
+
+    path = current_app.config.get('MATCHER_SNAPSHOT_PATH')
+    if path is None:
+        path = snapshot_path(current_app.config['SQLALCHEMY_DATABASE_URI'])
+    if not path:
+        return None
+    path = os.path.join(current_app.instance_path, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return GallerySnapshot(path)
+
+
+def _version_after_change(student_id):
+    """gallery_version() once this process applied its own change to a student
+
+    The matcher then matches the database only if it did before the change
+    and no other process changed a template since: the count agrees and no
+    other student's ``updated_at`` is past the loaded stamp. None otherwise,
+    so the next check reloads.
+    """
+    if _loaded_version is None:
+        return None
+    count, stamp = gallery_version()
+    if count != len(_matcher) or _changed_since(student_id)(_loaded_version[1]):
+        return None
+    return count, stamp
+
+
+def enroll_template(student_id, template_bytes, updated_at=None):
+    """Update the gallery and snapshot after a template is stored"""
+    global _loaded_version
+    with _matcher_lock:
+        if _matcher is not None:
+            _matcher.enroll(student_id, template_bytes)
+            _loaded_version = _version_after_change(student_id)
+
+    snapshot = get_snapshot()
+    if snapshot is not None and not snapshot.upsert(student_id, template_bytes, _stamp(updated_at),
+                                                    _changed_since(student_id)):
+        snapshot.invalidate()
+
+
+def remove_template(student_id):
+    """Update the gallery and snapshot after a student is deleted"""
+    global _loaded_version
+    with _matcher_lock:
+        if _matcher is not None:
+            _matcher.remove(student_id)
+            _loaded_version = _version_after_change(student_id)
+
+    snapshot = get_snapshot()
+    if snapshot is not None and not snapshot.remove(student_id):
+        snapshot.invalidate()
+
+
+def reset_matcher():
+    """Drop the loaded gallery so the next scan reloads it"""
+    global _matcher, _loaded_version
+    with _matcher_lock:
+        if _matcher is not None:
+            _matcher.close()
+        _matcher = None
+        _loaded_version = None
+
+
+__all__ = [
+    'Matcher', 'Candidate', 'ByteEqualityMatcher', 'TEMPLATE_SIZE', 'MATCHERS',
+    'GallerySnapshot', 'create_matcher', 'get_matcher', 'get_snapshot', 'snapshot_path', 'gallery_version',
+    'enroll_template', 'remove_template', 'reset_matcher'
+]
@@ -0,0 +1,78 @@
+"""
+Matcher interface
+
+A matcher owns the gallery of enrolled templates for this process and answers
+1:N identification and 1:1 verification queries against it. Scores are
+percentages (0-100); a score at or above ``threshold`` counts as a match.
+"""
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+TEMPLATE_SIZE = 512
+
+# One ranked 1:N result
+Candidate = namedtuple('Candidate', ['student_id', 'score'])
+
+
+class Matcher(ABC):
+    """Base class for fingerprint matching backends"""
+
+    name = None
+
+    def __init__(self, threshold=40):
+        self.threshold = threshold
+
+    @abstractmethod
+    def __len__(self):
+        """Number of enrolled templates"""
+
+    @abstractmethod
+    def load(self, rows):
+        """Replace the gallery from (student_id, template_bytes) pairs"""
+
+    def load_matrix(self, student_ids, matrix):
+        """Replace the gallery from a student ID array and an (N x 512) uint8 matrix"""
+        self.load((int(sid), bytes(row)) for sid, row in zip(student_ids, matrix))
+
+    @abstractmethod
+    def export(self):
+        """Current gallery as (student_ids, matrix) arrays, e.g. for snapshots"""
+
+    @abstractmethod
+    def enroll(self, student_id, template_bytes):
+        """Add or replace the template stored for a student"""
+
+    @abstractmethod
+    def remove(self, student_id):
+        """Drop a student's template from the gallery (no-op if absent)"""
+
+    @abstractmethod
+    def identify_top_k(self, template_bytes, k=1):
+        """1:N search - return up to k Candidates, best first"""
+
+    def identify(self, template_bytes):
+        """1:N search - return (student_id, score) of the best candidate, or (None, 0)"""
+        candidates = self.identify_top_k(template_bytes, 1)
+        if not candidates:
+            return None, 0
+        return candidates[0]
+
+    @abstractmethod
+    def verify(self, student_id, template_bytes):
+        """1:1 check - return the score against one student's template, or None if not enrolled"""
+
+    def stats(self):
+        """Operational counters for reporting (gallery size, candidate-set sizes, ...)"""
+        return {'backend': self.name, 'gallery_size': len(self)}
+
+    def close(self):
+        """Release worker processes or other resources held by the backend"""
+
+    def is_match(self, score):
+        """Whether a score clears the configured threshold"""
+        return score is not None and score >= self.threshold
+
+    def is_ambiguous(self, candidates, margin):
+        """Whether the runner-up is itself a match scoring within ``margin`` points of the best"""
+        return (len(candidates) > 1 and self.is_match(candidates[1].score)
+                and candidates[0].score - candidates[1].score < margin)
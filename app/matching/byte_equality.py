@@ -0,0 +1,157 @@
+"""
+Byte-equality matcher (baseline backend)
+
+Scores a probe by the percentage of byte positions equal to a stored template.
+Every enrolled template lives in one contiguous NumPy uint8 matrix (N x 512)
+with a parallel array of student IDs, so a 1:N scan is a single vectorized
+comparison over the whole matrix. Galleries of at least ``parallel_min_gallery``
+templates are scanned across ``workers`` processes (see parallel.py). With
+``prefilter_bands`` set, only templates sharing a signature bucket with the
+probe are scored (see prefilter.py).
+"""
+import threading
+import numpy as np
+from app.matching.base import Matcher, Candidate, TEMPLATE_SIZE
+from app.matching.parallel import ParallelScanner, top_k
+from app.matching.prefilter import BandedPrefilter
+
+
+class ByteEqualityMatcher(Matcher):
+    """Percentage of identical bytes, scanned with NumPy"""
+
+    name = 'byte_equality'
+
+    def __init__(self, threshold=40, workers=0, parallel_min_gallery=20000,
+                 prefilter_bands=0, prefilter_band_width=2):
+        super().__init__(threshold)
+        self._lock = threading.RLock()
+        self._matrix = np.empty((0, TEMPLATE_SIZE), dtype=np.uint8)
+        self._student_ids = np.empty(0, dtype=np.int64)
+        self._rows = {}  # student_id -> row in _matrix
+        self._version = 0  # Bumped on every gallery change
+        self.parallel_min_gallery = parallel_min_gallery
+        self._scanner = ParallelScanner(workers) if workers and workers > 1 else None
+        self._prefilter = BandedPrefilter(prefilter_bands, prefilter_band_width) if prefilter_bands else None
+
+    def __len__(self):
+        return len(self._student_ids)
+
+    def load(self, rows):
+        rows = [(sid, tpl) for sid, tpl in rows if tpl and len(tpl) == TEMPLATE_SIZE]
+        matrix = np.empty((len(rows), TEMPLATE_SIZE), dtype=np.uint8)
+        student_ids = np.empty(len(rows), dtype=np.int64)
+        for i, (sid, tpl) in enumerate(rows):
+            matrix[i] = np.frombuffer(tpl, dtype=np.uint8)
+            student_ids[i] = sid
+        self.load_matrix(student_ids, matrix)
+
+    def load_matrix(self, student_ids, matrix):
+        # Arrays are adopted as-is (a read-only memmap stays shared); changes
+        # always build new arrays instead of writing into them
+        with self._lock:
+            self._matrix = matrix
+            self._student_ids = student_ids
+            self._rows = {int(sid): i for i, sid in enumerate(student_ids)}
+            self._version += 1
+            if self._prefilter is not None:
+                self._prefilter.load(student_ids, matrix)
+
+    def enroll(self, student_id, template_bytes):
+        if not template_bytes or len(template_bytes) != TEMPLATE_SIZE:
+            self.remove(student_id)
+            return
+
+        row = np.frombuffer(template_bytes, dtype=np.uint8)
+        with self._lock:
+            position = self._rows.get(student_id)
+            replaced = position is not None
+            if replaced:
+                # Copy-on-write so a concurrent scan never sees a half-written row
+                matrix = np.array(self._matrix)
+                matrix[position] = row
+                self._matrix = matrix
+            else:
+                position = len(self._student_ids)
+                self._matrix = np.vstack([self._matrix, row[np.newaxis, :]])
+                self._student_ids = np.append(self._student_ids, student_id)
+                self._rows[student_id] = position
+            self._version += 1
+            if self._scanner is not None:
+                # Keep the shared copy current without republishing the whole matrix
+                if replaced:
+                    self._scanner.replace_row(self._version, position, row)
+                else:
+                    self._scanner.append_row(self._version, position, row)
+            if self._prefilter is not None:
+                self._prefilter.add(student_id, template_bytes)
+
+    def export(self):
+        with self._lock:
+            return self._student_ids, self._matrix
+
+    def remove(self, student_id):
+        with self._lock:
+            if student_id not in self._rows:
+                return
+            keep = self._student_ids != student_id
+            self._matrix = np.ascontiguousarray(self._matrix[keep])
+            self._student_ids = self._student_ids[keep]
+            self._rows = {int(sid): i for i, sid in enumerate(self._student_ids)}
+            self._version += 1
+            if self._prefilter is not None:
+                self._prefilter.remove(student_id)
+
+    def identify_top_k(self, template_bytes, k=1):
+        if len(template_bytes) != TEMPLATE_SIZE:
+            return []
+
+        with self._lock:
+            matrix = self._matrix
+            student_ids = self._student_ids
+            version = self._version
+            if self._prefilter is not None:
+                candidates = sorted(self._rows[sid] for sid in self._prefilter.candidates(template_bytes))
+                matrix = matrix[candidates]
+                student_ids = student_ids[candidates]
+
+        if not len(student_ids):
+            return []
+
+        if (self._scanner is not None and self._prefilter is None
+                and len(student_ids) >= self.parallel_min_gallery):
+            rows, counts = self._scanner.scan(matrix, version, bytes(template_bytes), k)
+        else:
+            probe = np.frombuffer(template_bytes, dtype=np.uint8)
+            matching_bytes = np.count_nonzero(matrix == probe, axis=1)
+            rows = top_k(matching_bytes, k)
+            counts = matching_bytes[rows]
+
+        return [Candidate(int(student_ids[row]), self._score(count)) for row, count in zip(rows, counts)]
+
+    def verify(self, student_id, template_bytes):
+        if len(template_bytes) != TEMPLATE_SIZE:
+            return None
+
+        with self._lock:
+            position = self._rows.get(student_id)
+            if position is None:
+                return None
+            stored = self._matrix[position]
+
+        probe = np.frombuffer(template_bytes, dtype=np.uint8)
+        return self._score(np.count_nonzero(stored == probe))
+
+    def stats(self):
+        stats = super().stats()
+        if self._prefilter is not None:
+            with self._lock:
+                stats['prefilter'] = self._prefilter.stats()
+        return stats
+
+    def close(self):
+        if self._scanner is not None:
+            self._scanner.close()
+
+    @staticmethod
+    def _score(matching_bytes):
+        return (int(matching_bytes) / TEMPLATE_SIZE) * 100
@@ -0,0 +1,194 @@
+"""
+Multi-core 1:N scanning for the byte-equality matcher
+
+The gallery matrix is published into a ``multiprocessing.shared_memory``
+block and split into row shards, one per worker process. Each worker attaches
+to the block once, counts equal bytes over its shard and returns its local
+top-k; the parent merges those into the global top-k. Scans of large
+galleries then run on all cores instead of one request thread under the GIL.
+
+Blocks are reference-counted by the scans submitted against them and only
+unlinked once none is still running, so queued shard tasks can always
+attach however many times the gallery changed in the meantime. A block is
+allocated with spare rows: an enrollment appends its row into the spare
+space and a re-enrollment overwrites its row in place (when no scan is
+reading the block), so single-row changes don't copy the whole matrix.
+Removals and reloads publish a fresh copy on the next scan.
+"""
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+import numpy as np
+
+SPARE_ROWS = 0.125  # Spare capacity of a new block, as a fraction of the gallery
+MIN_SPARE_ROWS = 64
+
+# Worker-side cache of the attached block: (name, SharedMemory, ndarray)
+_attached = None
+
+
+def top_k(counts, k):
+    """Indices of the k largest counts, best first (ties keep the lower index)"""
+    k = min(k, len(counts))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(counts):
+        candidates = np.argpartition(-counts, k - 1)[:k]
+    else:
+        candidates = np.arange(len(counts))
+    order = np.lexsort((candidates, -counts[candidates]))
+    return candidates[order]
+
+
+def _attach(name, width):
+    global _attached
+    if _attached is None or _attached[0] != name:
+        if _attached is not None:
+            _attached[1].close()
+        shm = shared_memory.SharedMemory(name=name)
+        matrix = np.ndarray((shm.size // width, width), dtype=np.uint8, buffer=shm.buf)
+        _attached = (name, shm, matrix)
+    return _attached[2]
+
+
+def _scan_shard(name, width, start, stop, probe_bytes, k):
+    """Worker task: top-k (row, matching_bytes) pairs within rows [start, stop)"""
+    matrix = _attach(name, width)
+    probe = np.frombuffer(probe_bytes, dtype=np.uint8)
+    counts = np.count_nonzero(matrix[start:stop] == probe, axis=1)
+    best = top_k(counts, k)
+    return best + start, counts[best]
+
+
+class _Block:
+    """One shared-memory copy of the gallery, with spare rows past ``rows``"""
+
+    def __init__(self, matrix):
+        rows, width = matrix.shape
+        self.capacity = rows + max(int(rows * SPARE_ROWS), MIN_SPARE_ROWS)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.capacity * width)
+        self.view = np.ndarray((self.capacity, width), dtype=np.uint8, buffer=self.shm.buf)
+        self.view[:rows] = matrix
+        self.rows = rows
+        self.scans = 0  # Scans submitted against this block and not finished yet
+
+    def free(self):
+        self.view = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ParallelScanner:
+    """Process pool that scans a shared-memory copy of the gallery matrix"""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._block = None  # Block new scans are submitted against
+        self._retired = []  # Replaced blocks still read by running scans
+        self._version = None  # Gallery version the current block holds
+        self._layout_version = None  # Version since which its rows kept their order
+        atexit.register(self.close)
+
+    def _acquire(self, matrix, version):
+        """The block to scan ``matrix`` (gallery ``version``) in, copying it first if needed
+
+        Returns None when the gallery was re-laid out after the caller read
+        it, so the current block's rows no longer line up with its matrix.
+        """
+        with self._lock:
+            if self._block is not None and version < self._layout_version:
+                return None
+            if self._block is None or version > self._version:
+                self._retire(self._block)
+                self._block = _Block(matrix)
+                self._version = self._layout_version = version
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._block.scans += 1
+            return self._block
+
+    def _release(self, block):
+        with self._lock:
+            block.scans -= 1
+            if block.scans == 0 and block in self._retired:
+                self._retired.remove(block)
+                block.free()
+
+    def _retire(self, block):
+        if block is None:
+            return
+        if block.scans:
+            self._retired.append(block)
+        else:
+            block.free()
+
+    def append_row(self, version, position, row):
+        """Enrollment of a new template at ``position`` that made the gallery ``version``
+
+        Written into the current block's spare rows when the block holds the
+        version just before; scans already running only read rows below it.
+        """
+        with self._lock:
+            block = self._block
+            if (block is None or self._version != version - 1
+                    or position != block.rows or block.rows >= block.capacity):
+                return
+            block.view[position] = row
+            block.rows += 1
+            self._version = version
+
+    def replace_row(self, version, position, row):
+        """Re-enrollment that overwrote row ``position``, making the gallery ``version``
+
+        Written in place only while no scan reads the block, so none sees a
+        half-written row; otherwise the next scan publishes a fresh copy.
+        """
+        with self._lock:
+            block = self._block
+            if block is None or self._version != version - 1 or block.scans or position >= block.rows:
+                return
+            block.view[position] = row
+            self._version = version
+
+    def scan(self, matrix, version, probe_bytes, k=1):
+        """Return (rows, matching_bytes) for the global top-k, best first"""
+        block = self._acquire(matrix, version)
+        if block is None:
+            # Rare race with a removal or reload: scan the caller's own copy here
+            counts = np.count_nonzero(matrix == np.frombuffer(probe_bytes, dtype=np.uint8), axis=1)
+            best = top_k(counts, k)
+            return best, counts[best]
+
+        try:
+            # Rows appended since the caller read the gallery sit past its matrix
+            rows, width = matrix.shape
+            shard_size = -(-rows // self.workers)
+            futures = [
+                self._executor.submit(_scan_shard, block.shm.name, width, start,
+                                      min(start + shard_size, rows), probe_bytes, k)
+                for start in range(0, rows, shard_size)
+            ]
+            wait(futures)
+            results = [future.result() for future in futures]
+        finally:
+            self._release(block)
+
+        shard_rows = np.concatenate([r for r, _ in results])
+        shard_counts = np.concatenate([c for _, c in results])
+        best = top_k(shard_counts, k)
+        return shard_rows[best], shard_counts[best]
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            for block in [self._block, *self._retired]:
+                if block is not None:
+                    block.free()
+            self._block = None
+            self._retired = []
+            self._version = self._layout_version = None
@@ -0,0 +1,101 @@
+"""
+Banded candidate pre-filter
+
+Each template gets a cheap signature at enrollment time: ``bands`` groups of
+``band_width`` byte positions, each group packed into one bucket key. A probe
+only needs full 512-byte scoring against templates that share at least one
+bucket key with it, so a scan touches a small candidate set instead of the
+whole gallery.
+
+For a genuine match with a fraction ``p`` of equal bytes, the chance that at
+least one band collides is ``1 - (1 - p ** band_width) ** bands``. More bands
+or narrower bands raise recall; fewer or wider bands shrink the candidate set.
+"""
+from collections import deque
+import numpy as np
+from app.matching.base import TEMPLATE_SIZE
+
+
+class BandedPrefilter:
+    """Locality-sensitive bucketing over sampled byte positions"""
+
+    def __init__(self, bands=32, band_width=2, seed=0, history=1000):
+        if bands * band_width > TEMPLATE_SIZE:
+            raise ValueError('bands * band_width must not exceed the template size')
+        self.bands = bands
+        self.band_width = band_width
+        positions = np.random.default_rng(seed).permutation(TEMPLATE_SIZE)
+        self._positions = positions[:bands * band_width].reshape(bands, band_width)
+        self._weights = np.left_shift(1, 8 * np.arange(band_width, dtype=np.int64))
+        self._buckets = [{} for _ in range(bands)]  # band -> key -> set of student_ids
+        self._signatures = {}  # student_id -> keys
+        self._candidate_sizes = deque(maxlen=history)
+
+    def signature(self, template_bytes):
+        """Bucket key per band for one template"""
+        template = np.frombuffer(template_bytes, dtype=np.uint8)
+        return (template[self._positions].astype(np.int64) * self._weights).sum(axis=1)
+
+    def add(self, student_id, template_bytes):
+        self.remove(student_id)
+        keys = self.signature(template_bytes)
+        for band, key in enumerate(keys.tolist()):
+            self._buckets[band].setdefault(key, set()).add(student_id)
+        self._signatures[student_id] = keys
+
+    def load(self, student_ids, matrix):
+        """Rebuild every bucket from an (N x 512) matrix in one vectorized pass"""
+        self.clear()
+        keys = (matrix[:, self._positions].astype(np.int64) * self._weights).sum(axis=2)
+        for band in range(self.bands):
+            buckets = self._buckets[band]
+            for student_id, key in zip(student_ids.tolist(), keys[:, band].tolist()):
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = {student_id}
+                else:
+                    bucket.add(student_id)
+        self._signatures = dict(zip(student_ids.tolist(), keys))
+
+    def remove(self, student_id):
+        keys = self._signatures.pop(student_id, None)
+        if keys is None:
+            return
+        for band, key in enumerate(keys.tolist()):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(student_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def clear(self):
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = {}
+
+    def candidates(self, template_bytes):
+        """Student IDs sharing at least one bucket with the probe"""
+        found = set()
+        for band, key in enumerate(self.signature(template_bytes).tolist()):
+            bucket = self._buckets[band].get(key)
+            if bucket:
+                found |= bucket
+        self._candidate_sizes.append(len(found))
+        return found
+
+    def expected_recall(self, score):
+        """Probability that a template matching ``score`` percent of bytes is kept"""
+        p = score / 100
+        return 1 - (1 - p ** self.band_width) ** self.bands
+
+    def stats(self):
+        """Candidate-set sizes over the most recent queries"""
+        sizes = np.array(self._candidate_sizes) if self._candidate_sizes else np.zeros(1)
+        return {
+            'bands': self.bands,
+            'band_width': self.band_width,
+            'queries': len(self._candidate_sizes),
+            'candidates_mean': float(sizes.mean()),
+            'candidates_p50': float(np.percentile(sizes, 50)),
+            'candidates_p99': float(np.percentile(sizes, 99)),
+            'candidates_max': int(sizes.max())
+        }
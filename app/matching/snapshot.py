@@ -0,0 +1,153 @@
+"""
+Memory-mapped template gallery snapshot
+
+Layout (little-endian):
+
+    header   64 bytes: magic, format, template size, rows, DB stamp
+    matrix   rows x 512 uint8
+    ids      rows x int64 (student IDs)
+
+Loading maps the file with ``numpy.memmap`` so every worker process shares
+the same page-cache pages instead of reading each template BLOB out of the
+database. The header's row count and DB stamp (latest ``Student.updated_at``
+among enrolled students) are compared against the database first; a
+mismatch means the snapshot is stale and must be rebuilt.
+
+A published file is never written to again. Every change builds a complete
+new file beside it and ``os.replace``s it over the old one, so a process
+that mapped the old file keeps reading the old inode, unchanged, until it
+loads the gallery again. The header takes the stamp of the change just
+written, and only when no other change is missing from the file; otherwise
+the file is dropped and rebuilt on the next load.
+"""
+import os
+import struct
+from contextlib import contextmanager
+import numpy as np
+from app.matching.base import TEMPLATE_SIZE
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locking
+    fcntl = None
+
+MAGIC = b'FPGALLRY'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<8sIIQq')
+HEADER_SIZE = 64
+
+
+class GallerySnapshot:
+    """Reader/writer for one snapshot file"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _offsets(self, count):
+        ids_offset = HEADER_SIZE + count * TEMPLATE_SIZE
+        return HEADER_SIZE, ids_offset
+
+    def read_header(self):
+        """Header fields as a dict, or None if the file is missing or not a snapshot"""
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read(HEADER.size)
+        except OSError:
+            return None
+        if len(raw) < HEADER.size:
+            return None
+        magic, fmt, size, count, stamp = HEADER.unpack(raw)
+        if magic != MAGIC or fmt != FORMAT_VERSION or size != TEMPLATE_SIZE:
+            return None
+        return {'count': count, 'stamp': stamp}
+
+    def load(self, expected_count, expected_stamp):
+        """Map the snapshot if it matches the DB; returns (student_ids, matrix) or None"""
+        header = self.read_header()
+        if header is None or header['count'] != expected_count or header['stamp'] != expected_stamp:
+            return None
+        return self._map(header['count'])
+
+    def _map(self, count):
+        if not count:
+            return np.empty(0, dtype=np.int64), np.empty((0, TEMPLATE_SIZE), dtype=np.uint8)
+        matrix_offset, ids_offset = self._offsets(count)
+        matrix = np.memmap(self.path, dtype=np.uint8, mode='r',
+                           offset=matrix_offset, shape=(count, TEMPLATE_SIZE))
+        student_ids = np.memmap(self.path, dtype='<i8', mode='r',
+                                offset=ids_offset, shape=(count,))
+        return student_ids, matrix
+
+    def write(self, student_ids, matrix, stamp):
+        """Replace the whole snapshot atomically"""
+        with self._locked():
+            self._write(student_ids, matrix, stamp)
+
+    def _write(self, student_ids, matrix, stamp):
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, TEMPLATE_SIZE, len(student_ids), stamp)
+                    .ljust(HEADER_SIZE, b'\0'))
+            f.write(np.ascontiguousarray(matrix, dtype=np.uint8).tobytes())
+            f.write(np.ascontiguousarray(student_ids, dtype='<i8').tobytes())
+        os.replace(tmp_path, self.path)
+
+    def upsert(self, student_id, template_bytes, stamp, changed_since=None):
+        """Publish a copy with one template added or replaced, stamped ``stamp``
+
+        ``changed_since(header_stamp)`` tells whether any other template
+        changed in the database after the file's current stamp. If one did,
+        or ``stamp`` is older than the file's (an out-of-order writer), the
+        file can't honestly be stamped as current: returns False and the
+        caller drops it so the next load rebuilds from the database.
+        """
+        with self._locked() as header:
+            if header is None:
+                return False
+            if stamp < header['stamp'] or (changed_since is not None and changed_since(header['stamp'])):
+                return False
+            student_ids, matrix = self._map(header['count'])
+            row = np.frombuffer(template_bytes, dtype=np.uint8)
+            existing = np.flatnonzero(student_ids == student_id)
+            if len(existing):
+                matrix = np.array(matrix)
+                matrix[existing] = row
+            else:
+                matrix = np.vstack([matrix, row[np.newaxis, :]])
+                student_ids = np.append(student_ids, student_id)
+            self._write(student_ids, matrix, stamp)
+            return True
+
+    def remove(self, student_id):
+        """Publish a copy without a student's row; returns False if the file is unusable"""
+        with self._locked() as header:
+            if header is None:
+                return False
+            student_ids, matrix = self._map(header['count'])
+            keep = student_ids != student_id
+            if not keep.all():
+                self._write(student_ids[keep], matrix[keep], header['stamp'])
+            return True
+
+    def invalidate(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive advisory lock across processes for read-modify-replace updates"""
+        try:
+            lock_file = open(f'{self.path}.lock', 'a')
+        except OSError:
+            yield None
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield self.read_header()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
@@ -0,0 +1,101 @@
+"""
+Versioned schema migrations
+
+``db.create_all()`` only creates missing tables; it never adds columns or
+indexes to tables that already exist. Each schema change after the initial
+tables is a numbered migration in ``app/migrations/versions.py``, and the
+versions already applied to a database are recorded in ``schema_migrations``.
+create_app() runs whatever is pending on startup, so an upgraded deployment
+needs no separate migrate_*.py step.
+
+Migrations inspect the live schema before changing it (add a column only if
+it is missing, create an index with checkfirst), so they are safe on a fresh
+database where create_all() already built everything from the models, and
+when several worker processes start at once.
+"""
+import logging
+from sqlalchemy import Column, Integer, MetaData, String, DateTime, Table, inspect, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app.utils.timezone import get_naive_now
+
+MIGRATIONS = []  # (version, description, function), filled by versions.py
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+
+def migration(version, description):
+    """Register ``function(conn)`` as schema migration ``version``"""
+    def register(function):
+        if any(existing[0] == version for existing in MIGRATIONS):
+            raise ValueError(f'Duplicate migration version {version}')
+        MIGRATIONS.append((version, description, function))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return function
+    return register
+
+
+def add_column(conn, table, column):
+    """ALTER TABLE ... ADD COLUMN for a model column unless it already exists
+
+    The column type is compiled for the connection's dialect, so the same
+    migration works on SQLite and PostgreSQL. Returns True if it was added.
+    """
+    existing = {c['name'] for c in inspect(conn).get_columns(table.name)}
+    if column.name in existing:
+        return False
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+    return True
+
+
+def create_index(conn, index):
+    """Create a model-declared index unless it already exists"""
+    index.create(bind=conn, checkfirst=True)
+
+
+def applied_versions(conn):
+    schema_migrations.create(bind=conn, checkfirst=True)
+    return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def run_migrations(engine):
+    """Apply every pending migration in version order; returns the versions applied"""
+    from app.migrations import versions  # noqa: F401 - registers MIGRATIONS
+
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for version, description, function in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                function(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=version, description=description, applied_at=get_naive_now()
+                ))
+        except (IntegrityError, OperationalError):
+            # Another worker applied it first; anything else is a real failure
+            with engine.begin() as conn:
+                if version not in applied_versions(conn):
+                    raise
+            continue
+        logging.info(f"Applied schema migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+
+def current_version(engine):
+    """Highest applied migration version (0 for an unmigrated database)"""
+    with engine.begin() as conn:
+        return max(applied_versions(conn), default=0)
+
+
+__all__ = ['MIGRATIONS', 'migration', 'add_column', 'create_index', 'run_migrations', 'current_version']
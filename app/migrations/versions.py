@@ -0,0 +1,75 @@
+"""
+Schema migrations, oldest first
+
+Never edit or renumber a migration that has shipped; add a new one instead.
+Versions 1-3 fold in the old migrate_attendance_fields.py,
+migrate_class_dates.py and schedule room scripts so older databases catch up
+automatically.
+"""
+from sqlalchemy import select
+from app.migrations import migration, add_column, create_index
+from app.models import Attendance, Class, ClassSchedule, ClassSession, DailyAttendanceSummary
+from app.utils.daily_summary import rebuild_daily_summary
+from app.utils.class_sessions import ended_by, sync_class_sessions
+from app.utils.timezone import get_naive_now
+
+
+@migration(1, 'attendance entry/exit columns')
+def attendance_entry_exit(conn):
+    table = Attendance.__table__
+    add_column(conn, table, table.c.entry_time)
+    add_column(conn, table, table.c.exit_time)
+    add_column(conn, table, table.c.duration_minutes)
+    conn.execute(table.update().where(table.c.entry_time.is_(None)).values(entry_time=table.c.timestamp))
+
+
+@migration(2, 'class date range columns')
+def class_date_range(conn):
+    table = Class.__table__
+    add_column(conn, table, table.c.start_date)
+    add_column(conn, table, table.c.end_date)
+    add_column(conn, table, table.c.total_classes)
+
+
+@migration(3, 'class schedule room column')
+def class_schedule_room(conn):
+    table = ClassSchedule.__table__
+    add_column(conn, table, table.c.room)
+
+
+@migration(4, 'attendance composite indexes')
+def attendance_indexes(conn):
+    names = {'ix_attendance_student_class_timestamp', 'ix_attendance_class_timestamp', 'ix_attendance_timestamp'}
+    for index in Attendance.__table__.indexes:
+        if index.name in names:
+            create_index(conn, index)
+
+
+@migration(5, 'daily attendance summary table')
+def daily_attendance_summary(conn):
+    # create_all() has usually made the (empty) table already; backfill it from attendance
+    DailyAttendanceSummary.__table__.create(bind=conn, checkfirst=True)
+    rebuild_daily_summary(conn)
+
+
+@migration(6, 'class session calendar')
+def class_session_calendar(conn):
+    # Generate every dated class's sessions; total_classes then counts them
+    ClassSession.__table__.create(bind=conn, checkfirst=True)
+    classes = Class.__table__
+    dated = conn.execute(select(classes.c.id, classes.c.start_date, classes.c.end_date).where(
+        classes.c.start_date.isnot(None), classes.c.end_date.isnot(None)
+    )).all()
+    for class_id, start_date, end_date in dated:
+        total = sync_class_sessions(conn, class_id, start_date, end_date)
+        if total:
+            conn.execute(classes.update().where(classes.c.id == class_id).values(total_classes=total))
+
+
+@migration(7, 'class session closed_at')
+def class_session_closed_at(conn):
+    # Sessions that ended before the upgrade count as closed; the absence job takes over from here
+    sessions = ClassSession.__table__
+    add_column(conn, sessions, sessions.c.closed_at)
+    now = get_naive_now()
+    conn.execute(sessions.update().where(sessions.c.closed_at.is_(None), ended_by(now)).values(closed_at=now))
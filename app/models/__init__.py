@@ -7,5 +7,7 @@ from app.models.device import Device
 from app.models.command import Command
 from app.models.class_model import Class
 from app.models.class_schedule import ClassSchedule
+from app.models.class_session import ClassSession
+from app.models.daily_attendance_summary import DailyAttendanceSummary
 
-__all__ = ['Student', 'Attendance', 'Device', 'Command', 'Class', 'ClassSchedule']
+__all__ = ['Student', 'Attendance', 'Device', 'Command', 'Class', 'ClassSchedule', 'ClassSession', 'DailyAttendanceSummary']
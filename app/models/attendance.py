@@ -5,6 +5,14 @@ from app.utils.timezone import get_naive_now
 
 class Attendance(db.Model):
     __tablename__ = 'attendance'
+    __table_args__ = (
+        # Scan state / per-student class history: student + class, then time range
+        db.Index('ix_attendance_student_class_timestamp', 'student_id', 'class_id', 'timestamp'),
+        # Class lists, stats and reports over a date range
+        db.Index('ix_attendance_class_timestamp', 'class_id', 'timestamp'),
+        # Dashboard counts, recent activity and date filters across all classes
+        db.Index('ix_attendance_timestamp', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -19,6 +27,15 @@ class Attendance(db.Model):
     device_id = db.Column(db.String(50), db.ForeignKey('devices.device_id'), nullable=True)
     notes = db.Column(db.Text, nullable=True)
     
+    @classmethod
+    def dict_options(cls):
+        """Loader options for queries whose rows go through to_dict() (student and class in the same SELECT)"""
+        from app.models.student import Student
+        return (
+            db.joinedload(cls.student).defer(Student.fingerprint_template),
+            db.joinedload(cls.class_obj)
+        )
+    
     def to_dict(self):
         """Convert model to dictionary"""
         return {
@@ -5,6 +5,9 @@ from datetime import datetime
 from app import db
 from app.utils.timezone import get_naive_now
 
+# Lightweight view of the students table for the count below (the Student model imports would cycle)
+_students = db.table('students', db.column('id'), db.column('class_id'))
+
 class Class(db.Model):
     """Class model - All datetime fields are stored in Asia/Dhaka timezone (timezone-naive)"""
     __tablename__ = 'classes'
@@ -25,6 +28,19 @@ class Class(db.Model):
     students = db.relationship('Student', backref='class_obj', lazy=True)
     attendances = db.relationship('Attendance', backref='class_obj', lazy=True)
     
+    # Counted in SQL rather than by loading every student; only selected when undeferred
+    # (dict_options), otherwise fetched on first access
+    student_count = db.column_property(
+        db.select(db.func.count(_students.c.id)).where(_students.c.class_id == id)
+        .correlate_except(_students).scalar_subquery(),
+        deferred=True
+    )
+    
+    @classmethod
+    def dict_options(cls):
+        """Loader options for queries whose rows go through to_dict() (schedules in one extra SELECT)"""
+        return (db.selectinload(cls.schedules), db.undefer(cls.student_count))
+    
     def to_dict(self):
         """Convert model to dictionary"""
         return {
@@ -40,7 +56,7 @@ class Class(db.Model):
             'total_classes': self.total_classes,
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'student_count': len(self.students) if self.students else 0
+            'student_count': self.student_count or 0
         }
     
     def __repr__(self):
@@ -14,6 +14,7 @@ class ClassSchedule(db.Model):
     day_of_week = db.Column(db.String(10), nullable=False)  # monday, tuesday, wednesday, etc.
     start_time = db.Column(db.Time, nullable=False)  # Time in Asia/Dhaka timezone
     end_time = db.Column(db.Time, nullable=False)  # Time in Asia/Dhaka timezone
+    room = db.Column(db.String(200), nullable=True)  # Matched against Device.location
     created_at = db.Column(db.DateTime, default=get_naive_now)  # Stored as Asia/Dhaka time (timezone-naive)
     
     # Relationships
@@ -32,6 +33,7 @@ class ClassSchedule(db.Model):
             'day_of_week': self.day_of_week,
             'start_time': self.start_time.strftime('%H:%M') if self.start_time else None,
             'end_time': self.end_time.strftime('%H:%M') if self.end_time else None,
+            'room': self.room,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
     
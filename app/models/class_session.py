@@ -0,0 +1,42 @@
+"""
+Class Session Model
+"""
+from app import db
+
+class ClassSession(db.Model):
+    """One concrete scheduled meeting of a class (date + times), generated from its ClassSchedules
+
+    Built and kept in step by app/utils/class_sessions.py from the class's
+    start_date..end_date and weekly schedule, and closed by the absence job
+    (app/utils/absences.py) once it ends. Times are Asia/Dhaka.
+    """
+    __tablename__ = 'class_sessions'
+    __table_args__ = (
+        # At most one schedule per weekday per class, so at most one session per date
+        db.UniqueConstraint('class_id', 'session_date', name='unique_class_session_date'),
+        db.Index('ix_class_sessions_date', 'session_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('classes.id', ondelete='CASCADE'), nullable=False)
+    session_date = db.Column(db.Date, nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    closed_at = db.Column(db.DateTime, nullable=True)  # When the absence job marked this session's absentees
+    
+    # Relationships
+    class_obj = db.relationship('Class', backref=db.backref('sessions', lazy=True, cascade='all, delete-orphan'))
+    
+    def to_dict(self):
+        """Convert model to dictionary"""
+        return {
+            'id': self.id,
+            'class_id': self.class_id,
+            'session_date': self.session_date.isoformat(),
+            'start_time': self.start_time.strftime('%H:%M'),
+            'end_time': self.end_time.strftime('%H:%M'),
+            'closed_at': self.closed_at.isoformat() if self.closed_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ClassSession {self.class_id} {self.session_date} {self.start_time}-{self.end_time}>'
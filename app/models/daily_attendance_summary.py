@@ -0,0 +1,34 @@
+"""
+Daily Attendance Summary Model
+"""
+from app import db
+
+class DailyAttendanceSummary(db.Model):
+    """Attendance totals per (day, class, student), kept in step with Attendance writes
+
+    Maintained incrementally by app/utils/daily_summary.py and rebuilt from the
+    attendance table by rebuild_daily_summary.py. Readers always SUM over
+    matching rows, so a key that ended up with two rows still adds up.
+    """
+    __tablename__ = 'daily_attendance_summary'
+    __table_args__ = (
+        # Delta upserts and date-range reports
+        db.Index('ix_daily_summary_day_class_student', 'day', 'class_id', 'student_id'),
+        # Per-class reports
+        db.Index('ix_daily_summary_class_day', 'class_id', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # Date of Attendance.timestamp (Asia/Dhaka)
+    class_id = db.Column(db.Integer, nullable=True)
+    student_id = db.Column(db.Integer, nullable=False)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+    late_count = db.Column(db.Integer, nullable=False, default=0)
+    absent_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)  # Records with an exit
+    duration_minutes = db.Column(db.Integer, nullable=False, default=0)  # Sum of non-zero durations
+    timed_count = db.Column(db.Integer, nullable=False, default=0)  # Records with a non-zero duration
+
+    def __repr__(self):
+        return f'<DailyAttendanceSummary {self.day} class={self.class_id} student={self.student_id}>'
@@ -21,6 +21,11 @@ class Device(db.Model):
     # Relationships
     current_class = db.relationship('Class', foreign_keys=[current_class_id])
     
+    @classmethod
+    def dict_options(cls):
+        """Loader options for queries whose rows go through to_dict()"""
+        return (db.joinedload(cls.current_class),)
+    
     def to_dict(self):
         """Convert model to dictionary"""
         return {
@@ -1,42 +1,75 @@
 """
 Attendance Routes
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime, timedelta
 from app import db
 from app.models import Attendance, Student, Device, Class
 from app.utils.timezone import get_naive_now
+from app.matching import get_matcher
+from app.utils.attendance_state import attendance_state, entry_status, invalidate_attendance_state
+from app.utils.event_bus import publish
+from app.utils.pagination import Keyset, page_args, stream_json
+from app.utils.reports import status_counts
+from app.utils.daily_summary import record_attendance_change
+from app.utils.scan_batch import record_scan_batch
+
+def identify_fingerprint_template(template_bytes):
+    """Rank fingerprint template against all stored templates
+    
+    Scoring, the match threshold, how many candidates are ranked and the
+    ambiguity margin come from config.py (MATCHER_BACKEND, MATCH_THRESHOLD,
+    MATCH_TOP_K, MATCH_AMBIGUITY_MARGIN).
+    
+    Returns: (student, confidence, candidates, ambiguous) - student is None if
+    the best candidate doesn't clear the threshold; candidates are the top-k
+    (student_id, score) pairs, best first
+    """
+    matcher = get_matcher()
+    candidates = matcher.identify_top_k(template_bytes, current_app.config.get('MATCH_TOP_K', 3))
+    
+    if candidates and matcher.is_match(candidates[0].score):
+        ambiguous = matcher.is_ambiguous(candidates, current_app.config.get('MATCH_AMBIGUITY_MARGIN', 5))
+        student = Student.query.get(candidates[0].student_id)
+        if student:
+            return student, int(candidates[0].score), candidates, ambiguous
+    
+    return None, 0, candidates, False
+
+def publish_attendance_event(attendance_id, student, class_name, action, status, at, duration_minutes=None):
+    """Push an entry/exit to live dashboards (same shape as /api/recent-attendance records)"""
+    publish('attendance', {
+        'id': attendance_id,
+        'student_name': student.name,
+        'student_id': student.student_id,
+        'class_name': class_name or 'N/A',
+        'timestamp': at.strftime('%H:%M:%S'),
+        'status': status,
+        'action': action,
+        'duration_minutes': duration_minutes
+    })
 
 def match_fingerprint_template(template_bytes):
     """Match fingerprint template against all stored templates
     
     Returns: (student, confidence) or (None, 0) if no match
     """
-    if len(template_bytes) != 512:
-        return None, 0
-    
-    # Get all students with templates
-    students = Student.query.filter(Student.fingerprint_template.isnot(None)).all()
-    
-    best_match = None
-    best_score = 0
+    student, confidence, _, _ = identify_fingerprint_template(template_bytes)
+    return student, confidence
+
+def verify_claimed_template(fingerprint_id, template_bytes):
+    """1:1 check of a template against the student the device claims it belongs to
     
-    for student in students:
-        if not student.fingerprint_template or len(student.fingerprint_template) != 512:
-            continue
-        
-        # Calculate matching score (simple byte comparison)
-        # In production, use proper fingerprint matching algorithm
-        matching_bytes = sum(1 for a, b in zip(template_bytes, student.fingerprint_template) if a == b)
-        score = (matching_bytes / 512) * 100
-        
-        if score > best_score:
-            best_score = score
-            best_match = student
+    Returns: (student, confidence) or (None, 0) if the claim doesn't clear the threshold
+    """
+    student = Student.query.filter_by(fingerprint_id=fingerprint_id).first()
+    if not student:
+        return None, 0
     
-    # Require at least 40% match (adjust threshold as needed)
-    if best_score >= 40:
-        return best_match, int(best_score)
+    matcher = get_matcher()
+    score = matcher.verify(student.id, template_bytes)
+    if matcher.is_match(score):
+        return student, int(score)
     
     return None, 0
 
@@ -61,6 +94,9 @@ def verify_and_mark_attendance():
     
     student = None
     match_confidence = confidence if confidence else 0
+    candidates = None
+    # Ranked candidates expose other students' IDs and scores: server config only
+    debug = current_app.config.get('MATCH_DEBUG_CANDIDATES', False)
     
     # Method 1: Server-side template matching (preferred)
     if template_hex:
@@ -68,15 +104,37 @@ def verify_and_mark_attendance():
             # Convert hex string to bytes
             template_bytes = bytes.fromhex(template_hex)
             
-            # Find matching student by comparing templates
-            student, match_confidence = match_fingerprint_template(template_bytes)
+            # Fast path: device already reported an ID, so score 1:1 against it
+            if fingerprint_id:
+                student, match_confidence = verify_claimed_template(fingerprint_id, template_bytes)
+                logging.info(f"1:1 verify against fingerprint_id {fingerprint_id}: {'match' if student else 'no match'}")
+            
+            # Fall back to comparing against all stored templates
+            ambiguous = False
+            if not student:
+                student, match_confidence, candidates, ambiguous = identify_fingerprint_template(template_bytes)
             
             if not student:
-                return jsonify({
+                response = {
                     'status': 'error',
                     'message': 'Fingerprint not recognized',
                     'confidence': 0
-                }), 404
+                }
+                if debug:
+                    response['candidates'] = [c._asdict() for c in candidates or []]
+                return jsonify(response), 404
+            
+            if ambiguous:
+                logging.warning(f"Ambiguous match for {student.name}: {candidates}")
+                response = {
+                    'status': 'error',
+                    'message': 'Ambiguous match',
+                    'details': 'Fingerprint is too close to more than one student. Please scan again.',
+                    'confidence': match_confidence
+                }
+                if debug:
+                    response['candidates'] = [c._asdict() for c in candidates]
+                return jsonify(response), 409
                 
         except Exception as e:
             return jsonify({
@@ -120,7 +178,7 @@ def verify_and_mark_attendance():
     # STEP 1: Check if there is a currently running class
     from app.routes.frontend import get_current_running_class
     
-    current_class = get_current_running_class()
+    current_class = get_current_running_class(device)
     logging.info(f"Current running class: {current_class}")
     
     if not current_class:
@@ -136,47 +194,28 @@ def verify_and_mark_attendance():
     class_name = current_class['name']
     logging.info(f"Class ID: {class_id}, Class Name: {class_name}")
     
-    # STEP 2: Check for recent attendance (within 3 minutes)
+    # STEP 2: Look up today's state for this student and class (cached per student/class/day)
     now = get_naive_now()
-    three_minutes_ago = now - timedelta(minutes=3)
-    logging.info(f"Current time: {now}, Checking attendance since: {three_minutes_ago}")
-    
-    recent_attendance = Attendance.query.filter(
-        Attendance.student_id == student.id,
-        Attendance.class_id == class_id,
-        Attendance.timestamp >= three_minutes_ago
-    ).order_by(Attendance.timestamp.desc()).first()
-    
-    logging.info(f"Recent attendance found: {recent_attendance is not None}")
+    state = attendance_state.get(student.id, class_id, now, current_app.config.get('ATTENDANCE_STATE_TTL', 60))
+    decision = state.decide(now)
+    logging.info(f"Current time: {now}, Last scan: {state.last_scan}, Decision: {decision}")
     
     # STEP 3: Handle entry/exit logic
-    if recent_attendance:
+    if decision == 'cooldown':
         # Within 3 minutes - ignore the fingerprint scan
-        time_diff = (now - recent_attendance.timestamp).total_seconds() / 60
+        time_diff = (now - state.last_scan).total_seconds() / 60
         logging.warning(f"Cooldown active for {student.name} - Last scan {time_diff:.1f} minutes ago")
         return jsonify({
             'status': 'cooldown',
             'message': f'Please wait {int(3 - time_diff)} more minute(s)',
             'details': 'You must wait 3 minutes between entry and exit',
             'student_name': student.name,
-            'last_scan': recent_attendance.timestamp.isoformat()
+            'last_scan': state.last_scan.isoformat()
         }), 400
     
-    # Check if there's an existing attendance record for this class today without exit
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    logging.info(f"Checking for completed attendance since: {today_start}")
-    
-    # First check if student already has BOTH entry and exit for this class today
-    completed_attendance = Attendance.query.filter(
-        Attendance.student_id == student.id,
-        Attendance.class_id == class_id,
-        Attendance.timestamp >= today_start,
-        Attendance.entry_time.isnot(None),
-        Attendance.exit_time.isnot(None)
-    ).first()
-    
-    if completed_attendance:
+    if decision == 'completed':
         # Student already completed entry and exit for this class
+        completed_attendance = state.completed
         logging.warning(f"{student.name} already has completed attendance for {class_name}")
         return jsonify({
             'status': 'error',
@@ -184,48 +223,53 @@ def verify_and_mark_attendance():
             'details': f'Entry and exit already marked for {class_name}',
             'student_name': student.name,
             'class_name': class_name,
-            'entry_time': completed_attendance.entry_time.strftime('%H:%M:%S'),
-            'exit_time': completed_attendance.exit_time.strftime('%H:%M:%S'),
-            'duration_minutes': completed_attendance.duration_minutes
+            'entry_time': completed_attendance['entry_time'].strftime('%H:%M:%S'),
+            'exit_time': completed_attendance['exit_time'].strftime('%H:%M:%S'),
+            'duration_minutes': completed_attendance['duration_minutes']
         }), 400
     
-    # Now check for pending entry (no exit yet)
-    existing_entry = Attendance.query.filter(
-        Attendance.student_id == student.id,
-        Attendance.class_id == class_id,
-        Attendance.timestamp >= today_start,
-        Attendance.exit_time.is_(None)
-    ).first()
-    
-    logging.info(f"Existing entry without exit found: {existing_entry is not None}")
-    
-    if existing_entry:
+    if decision == 'exit':
         # This is an EXIT scan (after 3 minutes cooldown has passed)
+        existing_entry = state.open_entry
         logging.info(f"Processing EXIT for {student.name}")
-        existing_entry.exit_time = now
         
         # Calculate duration in minutes
-        if existing_entry.entry_time:
-            duration = (now - existing_entry.entry_time).total_seconds() / 60
-            existing_entry.duration_minutes = int(duration)
-        
-        existing_entry.notes = f"Exited at {now.strftime('%H:%M:%S')}"
+        duration_minutes = None
+        if existing_entry['entry_time']:
+            duration_minutes = int((now - existing_entry['entry_time']).total_seconds() / 60)
         
+        # Write through without loading the row
+        Attendance.query.filter_by(id=existing_entry['id']).update({
+            'exit_time': now,
+            'duration_minutes': duration_minutes,
+            'notes': f"Exited at {now.strftime('%H:%M:%S')}"
+        }, synchronize_session=False)
+        entry_row = {'timestamp': existing_entry['timestamp'], 'class_id': class_id, 'student_id': student.id,
+                     'status': existing_entry['status'], 'exit_time': None, 'duration_minutes': None}
+        record_attendance_change(db.session, before=entry_row,
+                                 after=dict(entry_row, exit_time=now, duration_minutes=duration_minutes))
         db.session.commit()
+        state.record_exit(now, duration_minutes)
+        publish_attendance_event(existing_entry['id'], student, class_name, 'exit',
+                                 existing_entry['status'], now, duration_minutes)
         
-        logging.info(f"EXIT recorded - Duration: {existing_entry.duration_minutes} minutes")
+        logging.info(f"EXIT recorded - Duration: {duration_minutes} minutes")
         
-        return jsonify({
+        response = {
             'status': 'exit',
             'message': f'{student.name} exited from {class_name}',
             'student_name': student.name,
             'class_name': class_name,
-            'entry_time': existing_entry.entry_time.strftime('%H:%M:%S'),
+            'entry_time': existing_entry['entry_time'].strftime('%H:%M:%S') if existing_entry['entry_time'] else None,
             'exit_time': now.strftime('%H:%M:%S'),
-            'duration_minutes': existing_entry.duration_minutes,
-            'attendance_status': existing_entry.status,
-            'attendance_id': existing_entry.id
-        }), 200
+            'duration_minutes': duration_minutes,
+            'attendance_status': existing_entry['status'],
+            'attendance_id': existing_entry['id']
+        }
+        if debug and candidates is not None:
+            response['candidates'] = [c._asdict() for c in candidates]
+        
+        return jsonify(response), 200
     
     # This is an ENTRY scan (first scan or new session)
     logging.info(f"Processing ENTRY for {student.name}")
@@ -239,20 +283,12 @@ def verify_and_mark_attendance():
     current_datetime = datetime.combine(datetime.today(), current_time)
     time_remaining_minutes = int((class_end_datetime - current_datetime).total_seconds() / 60)
     
-    status = 'present'
-    late_by_minutes = 0
-    if current_time > class_start_time:
-        # Late if more than 5 minutes after class start
-        time_diff_minutes = (datetime.combine(datetime.today(), current_time) - 
-                            datetime.combine(datetime.today(), class_start_time)).total_seconds() / 60
-        if time_diff_minutes > 5:
-            status = 'late'
-            late_by_minutes = int(time_diff_minutes)
-            logging.info(f"Student is LATE by {late_by_minutes} minutes")
-        else:
-            logging.info(f"Student is ON TIME (within 5 min grace period)")
+    # Late if more than 5 minutes after class start
+    status, late_by_minutes = entry_status(class_start_time, now)
+    if status == 'late':
+        logging.info(f"Student is LATE by {late_by_minutes} minutes")
     else:
-        logging.info(f"Student is EARLY")
+        logging.info("Student is ON TIME or EARLY (within 5 min grace period)")
     
     # Create new attendance record for ENTRY
     attendance = Attendance(
@@ -268,10 +304,12 @@ def verify_and_mark_attendance():
     
     db.session.add(attendance)
     db.session.commit()
+    state.record_entry(attendance.id, now, status)
+    publish_attendance_event(attendance.id, student, class_name, 'entry', status, now)
     
     logging.info(f"ENTRY recorded successfully - Attendance ID: {attendance.id}")
     
-    return jsonify({
+    response = {
         'status': 'entry',
         'message': f'{student.name} entered {class_name}',
         'student_name': student.name,
@@ -284,6 +322,56 @@ def verify_and_mark_attendance():
         'late_by_minutes': late_by_minutes if status == 'late' else 0,
         'confidence': match_confidence,
         'attendance_id': attendance.id
+    }
+    if debug and candidates is not None:
+        response['candidates'] = [c._asdict() for c in candidates]
+    
+    return jsonify(response), 200
+
+@bp.route('/batch', methods=['POST'])
+def record_attendance_batch():
+    """Record scans a device buffered while offline, in one transaction
+    
+    Body: {'device_id', 'scans': [{'fingerprint_id', 'confidence', and either
+    'timestamp' (ISO 8601, Asia/Dhaka if naive) or 'age_seconds' (how long
+    before this request the scan was taken)}]}. Each scan is validated
+    against the schedule at its own time; the results list has one entry per
+    scan, in request order (see app/utils/scan_batch.py).
+    """
+    import logging
+    
+    data = request.get_json(silent=True) or {}
+    scans = data.get('scans')
+    device_id = data.get('device_id', 'ESP32-01')
+    max_scans = current_app.config.get('ATTENDANCE_BATCH_MAX_SCANS', 500)
+    
+    if not isinstance(scans, list) or not scans:
+        return jsonify({'status': 'error', 'message': 'scans must be a non-empty list'}), 400
+    if len(scans) > max_scans:
+        return jsonify({'status': 'error', 'message': f'At most {max_scans} scans per batch'}), 413
+    
+    from app.routes.frontend import get_current_running_class
+    
+    received_at = get_naive_now()
+    device = Device.query.filter_by(device_id=device_id).first()
+    try:
+        results, keys = record_scan_batch(db.session, scans, device_id, received_at,
+                                          lambda at: get_current_running_class(device, at))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Attendance batch from {device_id} failed: {e}")
+        return jsonify({'status': 'error', 'message': 'Batch not recorded, retry later'}), 500
+    attendance_state.forget(keys)
+    
+    recorded = sum(1 for result in results if result['status'] in ('entry', 'exit'))
+    logging.info(f"Attendance batch from {device_id}: {recorded} of {len(scans)} scans recorded")
+    
+    return jsonify({
+        'status': 'ok',
+        'received': len(scans),
+        'recorded': recorded,
+        'results': results
     }), 200
 
 @bp.route('/mark', methods=['POST'])
@@ -313,6 +401,9 @@ def mark_attendance():
     
     db.session.add(attendance)
     db.session.commit()
+    invalidate_attendance_state(student.id)
+    publish_attendance_event(attendance.id, student, attendance.class_obj.name if attendance.class_obj else None,
+                             'entry', status, attendance.timestamp)
     
     return jsonify({
         'message': 'Attendance marked successfully',
@@ -321,13 +412,17 @@ def mark_attendance():
 
 @bp.route('/', methods=['GET'])
 def list_attendance():
-    """List attendance records with filters"""
+    """List attendance records with filters, newest first
+
+    Pages with ``cursor`` (the previous page's ``next_cursor``) and ``limit``;
+    ``stream=true`` returns every matching record as a streamed JSON array.
+    """
     student_id = request.args.get('student_id', type=int)
     class_id = request.args.get('class_id', type=int)
     date = request.args.get('date')  # Format: YYYY-MM-DD
-    limit = request.args.get('limit', type=int, default=100)
+    cursor, limit, stream = page_args(request.args, 100, current_app.config.get('API_MAX_PAGE_SIZE', 1000))
     
-    query = Attendance.query
+    query = Attendance.query.options(*Attendance.dict_options())
     
     if student_id:
         query = query.filter_by(student_id=student_id)
@@ -346,11 +441,18 @@ def list_attendance():
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     
-    attendances = query.order_by(Attendance.timestamp.desc()).limit(limit).all()
+    keyset = Keyset(Attendance.timestamp, Attendance.id, descending=True)
+    try:
+        if stream:
+            return stream_json('attendances', keyset.iter_rows(query, cursor), Attendance.to_dict)
+        attendances, next_cursor = keyset.page(query, cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
         'attendances': [att.to_dict() for att in attendances],
-        'count': len(attendances)
+        'count': len(attendances),
+        'next_cursor': next_cursor
     }), 200
 
 @bp.route('/<int:attendance_id>', methods=['GET'])
@@ -369,16 +471,22 @@ def delete_attendance(attendance_id):
     if not attendance:
         return jsonify({'error': 'Attendance record not found'}), 404
     
+    student_id = attendance.student_id
     db.session.delete(attendance)
     db.session.commit()
+    invalidate_attendance_state(student_id)
     
     return jsonify({'message': 'Attendance record deleted successfully'}), 200
 
 @bp.route('/stats', methods=['GET'])
 def get_attendance_stats():
-    """Get attendance statistics"""
+    """Get attendance statistics
+
+    ``breakdown=day,class`` adds per-day and per-class counts (same query).
+    """
     class_id = request.args.get('class_id', type=int)
     date = request.args.get('date')
+    breakdown = set(request.args.get('breakdown', '').split(','))
     
     query = Attendance.query
     
@@ -396,15 +504,8 @@ def get_attendance_stats():
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     
-    total = query.count()
-    present = query.filter_by(status='present').count()
-    absent = query.filter_by(status='absent').count()
-    late = query.filter_by(status='late').count()
+    counts = status_counts(query, by_day='day' in breakdown, by_class='class' in breakdown)
+    total, present = counts['total'], counts['present']
+    counts['attendance_rate'] = round((present / total * 100) if total > 0 else 0, 2)
     
-    return jsonify({
-        'total': total,
-        'present': present,
-        'absent': absent,
-        'late': late,
-        'attendance_rate': round((present / total * 100) if total > 0 else 0, 2)
-    }), 200
+    return jsonify(counts), 200
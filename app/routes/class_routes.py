@@ -1,21 +1,39 @@
 """
 Class Management Routes
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models import Class, Student
+from app.utils.attendance_state import invalidate_attendance_state
+from app.utils.schedule_resolver import invalidate_schedule_cache
+from app.utils.pagination import Keyset, page_args, stream_json
+from app.utils.reports import absence_matrix, build_class_report
 
 bp = Blueprint('classes', __name__, url_prefix='/api/classes')
 
 @bp.route('/', methods=['GET'])
 def list_classes():
-    """List all classes"""
+    """List classes (all by name, or paged by id with ``limit`` / ``cursor`` / ``stream=true``)"""
     active_only = request.args.get('active', 'false').lower() == 'true'
     
-    query = Class.query
+    query = Class.query.options(*Class.dict_options())
     if active_only:
         query = query.filter_by(is_active=True)
     
+    if {'limit', 'cursor', 'stream'} & request.args.keys():
+        cursor, limit, stream = page_args(request.args, 100, current_app.config.get('API_MAX_PAGE_SIZE', 1000))
+        keyset = Keyset(Class.id)
+        try:
+            if stream:
+                return stream_json('classes', keyset.iter_rows(query, cursor), Class.to_dict)
+            classes, next_cursor = keyset.page(query, cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'classes': [cls.to_dict() for cls in classes],
+            'next_cursor': next_cursor
+        }), 200
+    
     classes = query.order_by(Class.name).all()
     return jsonify({
         'classes': [cls.to_dict() for cls in classes]
@@ -55,6 +73,7 @@ def create_class():
     
     db.session.add(class_obj)
     db.session.commit()
+    invalidate_schedule_cache()
     
     return jsonify({
         'message': 'Class created successfully',
@@ -91,6 +110,7 @@ def update_class(class_id):
         class_obj.is_active = data['is_active']
     
     db.session.commit()
+    invalidate_schedule_cache()
     
     return jsonify({
         'message': 'Class updated successfully',
@@ -106,6 +126,8 @@ def delete_class(class_id):
     
     db.session.delete(class_obj)
     db.session.commit()
+    invalidate_schedule_cache()
+    invalidate_attendance_state(class_id=class_id)
     
     return jsonify({'message': 'Class deleted successfully'}), 200
 
@@ -122,3 +144,54 @@ def get_class_students(class_id):
         'class': class_obj.to_dict(),
         'students': [student.to_dict() for student in students]
     }), 200
+
+@bp.route('/<int:class_id>/attendance-report', methods=['GET'])
+def get_class_attendance_report(class_id):
+    """Per-student attendance percentage and marks (query: max_marks, default 10)"""
+    class_obj = Class.query.get(class_id)
+    if not class_obj:
+        return jsonify({'error': 'Class not found'}), 404
+    
+    max_marks = request.args.get('max_marks', default=10, type=float)
+    report = build_class_report(class_obj, max_marks)
+    
+    return jsonify({
+        'class_id': class_obj.id,
+        'class_name': class_obj.name,
+        'total_classes': class_obj.total_classes or 0,
+        'max_marks': max_marks,
+        'class_average': round(report['class_average'], 2),
+        'avg_duration': round(report['avg_duration'], 2),
+        'students': [{
+            'id': data['student'].id,
+            'name': data['student'].name,
+            'student_id': data['student'].student_id,
+            'fingerprint_id': data['student'].fingerprint_id,
+            'classes_attended': data['classes_attended'],
+            'avg_duration': round(data['avg_duration'], 2),
+            'attendance_percentage': round(data['attendance_percentage'], 2),
+            'marks': round(data['marks'], 2)
+        } for data in report['attendance_data']]
+    }), 200
+
+@bp.route('/<int:class_id>/absences', methods=['GET'])
+def get_class_absences(class_id):
+    """Which sessions held so far each student attended or missed"""
+    class_obj = Class.query.get(class_id)
+    if not class_obj:
+        return jsonify({'error': 'Class not found'}), 404
+    
+    matrix = absence_matrix(class_obj)
+    
+    return jsonify({
+        'class_id': class_obj.id,
+        'class_name': class_obj.name,
+        'sessions': [session.to_dict() for session in matrix['sessions']],
+        'students': [{
+            'id': row['student'].id,
+            'name': row['student'].name,
+            'student_id': row['student'].student_id,
+            'attended': row['attended'],
+            'absences': row['absences']
+        } for row in matrix['students']]
+    }), 200
@@ -1,18 +1,46 @@
 """
 Device Management Routes
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime, timedelta
 from app import db
 from app.models import Device, Command, Class
 from app.utils.timezone import get_naive_now
+from app.matching import enroll_template
+from app.utils.event_bus import cooperative, event_bus
+from app.utils.device_events import device_topic
+from app.utils.heartbeats import heartbeats
+from app.utils.pagination import Keyset, page_args, stream_json
 
 bp = Blueprint('device', __name__, url_prefix='/api/device')
 
+def record_heartbeat(device_id):
+    """Note that a registered device checked in (written to the database in batches)"""
+    heartbeats.beat(device_id, flush_interval=current_app.config.get('HEARTBEAT_FLUSH_SECONDS', 10))
+
+def long_poll_seconds(data):
+    """Seconds a device asked to wait for changes ('wait' in the body), capped by config
+
+    0 unless running under gevent: elsewhere a parked request holds a whole
+    worker thread, so the device gets an immediate answer and polls again.
+    """
+    if not cooperative():
+        return 0
+    try:
+        wait = float(data.get('wait') or 0)
+    except (TypeError, ValueError):
+        wait = 0
+    return max(0, min(wait, current_app.config.get('DEVICE_LONG_POLL_SECONDS', 20)))
+
+def park(subscription, seconds):
+    """Wait for a device notification without holding a database connection"""
+    db.session.close()
+    return subscription.wait(seconds)
+
 @bp.route('/status', methods=['GET'])
 def get_all_devices_status():
     """Get online/offline status of all devices"""
-    devices = Device.query.all()
+    devices = heartbeats.apply(Device.query.options(*Device.dict_options()).all())
     now = get_naive_now()
     
     device_statuses = []
@@ -41,23 +69,8 @@ def get_all_devices_status():
     
     return jsonify({'devices': device_statuses}), 200
 
-@bp.route('/mode', methods=['POST'])
-def get_device_mode():
-    """Get current device mode and class info"""
-    data = request.get_json()
-    device_id = data.get('device_id')
-    
-    if not device_id:
-        return jsonify({'error': 'device_id is required'}), 400
-    
-    device = Device.query.filter_by(device_id=device_id).first()
-    if not device:
-        return jsonify({'error': 'Device not found'}), 404
-    
-    # Update last seen
-    device.last_seen = get_naive_now()
-    db.session.commit()
-    
+def device_mode_response(device):
+    """Mode payload sent to a device"""
     response = {
         'mode': device.mode,
         'device_id': device.device_id,
@@ -71,27 +84,87 @@ def get_device_mode():
         
         # Get current running class to include time remaining
         from app.routes.frontend import get_current_running_class
-        current_class = get_current_running_class()
+        current_class = get_current_running_class(device)
         if current_class and current_class['id'] == device.current_class_id:
             response['time_remaining_minutes'] = current_class['time_remaining_minutes']
             response['class_end_time'] = current_class['end_time']
     
-    return jsonify(response), 200
+    return response
 
-@bp.route('/poll', methods=['POST'])
-def poll_commands():
-    """Poll for pending commands"""
+@bp.route('/mode', methods=['POST'])
+def get_device_mode():
+    """Get current device mode and class info
+    
+    Long-poll: send the mode (and class_id) the device already has plus
+    'wait': N seconds, and the request is held until the mode or class
+    changes or N seconds pass (capped at DEVICE_LONG_POLL_SECONDS).
+    """
     data = request.get_json()
     device_id = data.get('device_id')
     
     if not device_id:
         return jsonify({'error': 'device_id is required'}), 400
     
-    # Get pending command for this device
-    command = Command.query.filter_by(
+    wait = long_poll_seconds(data)
+    # Subscribe before reading so a change committed in between still wakes us
+    subscription = event_bus.subscribe([device_topic(device_id)]) if wait else None
+    try:
+        device = Device.query.filter_by(device_id=device_id).first()
+        if not device:
+            return jsonify({'error': 'Device not found'}), 404
+        
+        # Update last seen (in memory; no write transaction per heartbeat)
+        record_heartbeat(device_id)
+        
+        response = device_mode_response(device)
+        
+        unchanged = (data.get('mode') == response['mode'] and
+                     data.get('class_id') == response.get('class_id'))
+        if subscription and unchanged and park(subscription, wait):
+            device = Device.query.filter_by(device_id=device_id).first()
+            if device:
+                response = device_mode_response(device)
+    finally:
+        if subscription:
+            subscription.close()
+    
+    return jsonify(response), 200
+
+def pending_command(device_id):
+    return Command.query.filter_by(
         device_id=device_id,
         status='pending'
     ).order_by(Command.created_at.asc()).first()
+
+@bp.route('/poll', methods=['POST'])
+def poll_commands():
+    """Poll for pending commands
+    
+    Long-poll: with 'wait': N seconds the request is held until a command is
+    created for the device or its mode changes, or N seconds pass (capped at
+    DEVICE_LONG_POLL_SECONDS).
+    """
+    data = request.get_json()
+    device_id = data.get('device_id')
+    
+    if not device_id:
+        return jsonify({'error': 'device_id is required'}), 400
+    
+    # Only registered devices get a heartbeat, so arbitrary IDs can't grow the map
+    if db.session.query(Device.id).filter_by(device_id=device_id).first():
+        record_heartbeat(device_id)
+    
+    wait = long_poll_seconds(data)
+    # Subscribe before querying so a command committed in between still wakes us
+    subscription = event_bus.subscribe([device_topic(device_id)]) if wait else None
+    try:
+        # Get pending command for this device
+        command = pending_command(device_id)
+        if not command and subscription and park(subscription, wait):
+            command = pending_command(device_id)
+    finally:
+        if subscription:
+            subscription.close()
     
     if not command:
         return jsonify({
@@ -149,6 +222,7 @@ def complete_command(command_id):
             if student:
                 student.fingerprint_template = template_bytes
                 db.session.commit()
+                enroll_template(student.id, template_bytes, student.updated_at)
                 print(f"Stored template for student: {student.name} (ID: {student.id})")
             else:
                 print(f"Warning: Student not found for fingerprint_id: {command.fingerprint_id}")
@@ -213,8 +287,24 @@ def set_device_mode():
 
 @bp.route('/list', methods=['GET'])
 def list_devices():
-    """List all devices"""
-    devices = Device.query.all()
+    """List devices (all, or paged by id with ``limit`` / ``cursor`` / ``stream=true``)"""
+    if {'limit', 'cursor', 'stream'} & request.args.keys():
+        cursor, limit, stream = page_args(request.args, 100, current_app.config.get('API_MAX_PAGE_SIZE', 1000))
+        query = Device.query.options(*Device.dict_options())
+        keyset = Keyset(Device.id)
+        try:
+            if stream:
+                rows = keyset.iter_rows(query, cursor)
+                return stream_json('devices', rows, lambda device: heartbeats.apply([device])[0].to_dict())
+            devices, next_cursor = keyset.page(query, cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'devices': [device.to_dict() for device in heartbeats.apply(devices)],
+            'next_cursor': next_cursor
+        }), 200
+    
+    devices = heartbeats.apply(Device.query.options(*Device.dict_options()).all())
     return jsonify({
         'devices': [device.to_dict() for device in devices]
     }), 200
@@ -226,4 +316,5 @@ def get_device(device_id):
     if not device:
         return jsonify({'error': 'Device not found'}), 404
     
+    heartbeats.apply([device])
     return jsonify(device.to_dict()), 200
@@ -0,0 +1,95 @@
+"""
+Server-Sent Events Routes
+"""
+import json
+import threading
+import time as clock
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from app.utils.event_bus import cooperative, event_bus
+
+bp = Blueprint('events', __name__, url_prefix='/api/events')
+
+# Topics browsers may subscribe to
+PUBLIC_TOPICS = {'attendance'}
+
+# Open streams holding a thread each (only counted when not under gevent)
+_threaded_lock = threading.Lock()
+_threaded_streams = 0
+
+def claim_threaded_stream(limit):
+    """Reserve one of ``limit`` thread-holding stream slots; False when all are taken"""
+    global _threaded_streams
+    with _threaded_lock:
+        if _threaded_streams >= limit:
+            return False
+        _threaded_streams += 1
+        return True
+
+def release_threaded_stream():
+    global _threaded_streams
+    with _threaded_lock:
+        _threaded_streams -= 1
+
+def format_event(event):
+    """One SSE frame"""
+    return f"id: {event.id}\nevent: {event.topic}\ndata: {json.dumps(event.data)}\n\n"
+
+@bp.route('/stream', methods=['GET'])
+def stream():
+    """Push published events to the browser as text/event-stream
+
+    Query: topics=attendance (comma separated). Browsers reconnect with the
+    Last-Event-ID header and receive anything they missed from the bus
+    history. The stream closes after SSE_STREAM_SECONDS so connections are
+    recycled; EventSource reconnects on its own.
+
+    Idle streams are only cheap under gevent. Otherwise each one holds a
+    server thread, so at most SSE_THREADED_STREAMS are served and further
+    requests get 503, on which the dashboard falls back to polling.
+    """
+    topics = {t for t in request.args.get('topics', 'attendance').split(',') if t in PUBLIC_TOPICS}
+    if not topics:
+        return jsonify({'error': f'topics must be one of: {", ".join(sorted(PUBLIC_TOPICS))}'}), 400
+
+    threaded = not cooperative()
+    if threaded and not claim_threaded_stream(current_app.config.get('SSE_THREADED_STREAMS', 0)):
+        return jsonify({
+            'error': 'Live updates need a gevent worker (see README); poll instead',
+            'poll': '/api/recent-attendance'
+        }), 503
+
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    last_id = int(last_id) if last_id and last_id.isdigit() else event_bus.last_id()
+    keepalive = current_app.config.get('SSE_KEEPALIVE_SECONDS', 15)
+    lifetime = current_app.config.get('SSE_STREAM_SECONDS', 300)
+
+    def generate():
+        # Subscribe only once the stream is running so a client that never reads can't leak it
+        with event_bus.subscribe(topics, last_id) as subscription:
+            # Tell EventSource how soon to reconnect when we close the stream
+            yield 'retry: 2000\n\n'
+            deadline = clock.monotonic() + lifetime
+            while clock.monotonic() < deadline:
+                events = subscription.wait(min(keepalive, max(deadline - clock.monotonic(), 0)))
+                if events:
+                    for event in events:
+                        yield format_event(event)
+                else:
+                    yield ': keepalive\n\n'
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # nginx: don't buffer the stream
+    })
+    if threaded:
+        # Runs when the server closes the response, even if the stream was never read
+        response.call_on_close(release_threaded_stream)
+    return response
+
+@bp.route('/stats', methods=['GET'])
+def stats():
+    """Topics and subscriber counts for this worker process"""
+    stats = event_bus.stats()
+    stats['cooperative'] = cooperative()
+    stats['threaded_streams'] = _threaded_streams
+    return jsonify(stats), 200
@@ -1,79 +1,72 @@
 """
 Frontend Routes
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from datetime import datetime, time, timedelta
 from app import db
-from app.models import Student, Attendance, Device, Command, Class, ClassSchedule
-from app.utils.timezone import get_naive_now, get_today_start
+from app.models import Student, Attendance, Device, Command, Class
+from app.utils.timezone import get_naive_now
+from app.matching import remove_template
+from app.utils.attendance_state import invalidate_attendance_state
+from app.utils.stats_cache import get_stats
+from app.utils.heartbeats import heartbeats
+from app.utils.reports import build_class_report, status_counts, summary_status_counts, summary_top_students
+from app.utils.daily_summary import day_range
+from app.utils.class_sessions import sync_class_sessions
+from app.utils.schedule_resolver import schedule_resolver, invalidate_schedule_cache
 
 bp = Blueprint('frontend', __name__)
 
 @bp.route('/')
 def index():
     """Dashboard home page"""
-    # Get statistics
-    total_students = Student.query.count()
-    total_classes = Class.query.filter_by(is_active=True).count()
-    total_devices = Device.query.count()
-    
-    # Today's attendance
-    today_start = get_today_start()
-    today_attendance = Attendance.query.filter(Attendance.timestamp >= today_start).count()
+    # Get statistics (shared with the sidebar)
+    stats = get_stats(current_app.config.get('STATS_CACHE_TTL', 30))
     
     # Recent attendance records
-    recent_attendance = Attendance.query.order_by(Attendance.timestamp.desc()).limit(10).all()
+    recent_attendance = Attendance.query.options(*Attendance.dict_options()).order_by(
+        Attendance.timestamp.desc()
+    ).limit(10).all()
     
     # Active devices
-    devices = Device.query.all()
+    devices = heartbeats.apply(Device.query.options(*Device.dict_options()).all())
     
     # Get current running class
     current_class = get_current_running_class()
     
     return render_template('dashboard/index.html',
-                         total_students=total_students,
-                         total_classes=total_classes,
-                         total_devices=total_devices,
-                         today_attendance=today_attendance,
+                         total_students=stats['total_students'],
+                         total_classes=stats['total_classes'],
+                         total_devices=stats['total_devices'],
+                         today_attendance=stats['today_attendance'],
                          recent_attendance=recent_attendance,
                          devices=devices,
                          current_class=current_class)
 
-def get_current_running_class():
-    """Get the currently running class based on schedule"""
-    now = get_naive_now()
-    current_time = now.time()
-    day_of_week = now.strftime('%A').lower()
-    
-    # Find active schedules for today
-    schedules = ClassSchedule.query.filter_by(day_of_week=day_of_week).all()
-    
-    for schedule in schedules:
-        if schedule.start_time <= current_time <= schedule.end_time:
-            class_obj = Class.query.get(schedule.class_id)
-            if class_obj and class_obj.is_active:
-                # Calculate time remaining
-                from datetime import datetime
-                end_datetime = datetime.combine(datetime.today(), schedule.end_time)
-                current_datetime = datetime.combine(datetime.today(), current_time)
-                time_remaining_minutes = int((end_datetime - current_datetime).total_seconds() / 60)
-                
-                return {
-                    'id': class_obj.id,
-                    'name': class_obj.name,
-                    'code': class_obj.code,
-                    'teacher_name': class_obj.teacher_name,
-                    'start_time': schedule.start_time.strftime('%H:%M'),
-                    'end_time': schedule.end_time.strftime('%H:%M'),
-                    'time_remaining_minutes': time_remaining_minutes
-                }
-    
-    return None
+def get_current_running_class(device=None, at=None):
+    """Get the currently running class based on schedule (served from the cached resolver)
+    
+    With a device, only classes scheduled in the device's location (or with no
+    room set) are considered, and the class it is pinned to in attendance mode
+    takes precedence while it is running. ``at`` asks about another time
+    (buffered scans) instead of now.
+    """
+    ttl = current_app.config.get('SCHEDULE_CACHE_TTL', 60)
+    at = at or get_naive_now()
+    if device is None:
+        return schedule_resolver.running(at, ttl)
+    
+    pinned_class_id = device.current_class_id if device.mode == 'attendance' else None
+    return schedule_resolver.running(at, ttl, room=device.location, class_id=pinned_class_id)
 
 @bp.route('/api/current-class')
 def api_current_class():
-    """API endpoint for current running class"""
-    current_class = get_current_running_class()
+    """API endpoint for current running class (optionally for one device's location)"""
+    device = None
+    device_id = request.args.get('device_id')
+    if device_id:
+        device = Device.query.filter_by(device_id=device_id).first()
+    current_class = get_current_running_class(device)
     return jsonify(current_class if current_class else {})
 
 @bp.route('/api/recent-attendance')
@@ -82,7 +75,7 @@ def api_recent_attendance():
     last_id = request.args.get('last_id', 0, type=int)
     
     # Get attendance records newer than last_id
-    new_attendance = Attendance.query.filter(
+    new_attendance = Attendance.query.options(*Attendance.dict_options()).filter(
         Attendance.id > last_id
     ).order_by(Attendance.timestamp.desc()).limit(10).all()
     
@@ -131,14 +124,21 @@ def students_list():
     if search:
         query = query.filter(Student.name.contains(search))
     
-    students = query.order_by(Student.name).all()
+    students = query.options(db.joinedload(Student.class_obj)).order_by(Student.name).all()
     classes = Class.query.filter_by(is_active=True).all()
     devices = Device.query.all()
     
+    # One query for every student's enrollment badge (instead of has_verified_fingerprint() per row)
+    verified_fingerprints = {fingerprint_id for (fingerprint_id,) in db.session.query(Command.fingerprint_id).filter_by(
+        command_type='enroll',
+        status='completed'
+    ).distinct()}
+    
     return render_template('students/list.html', 
                          students=students, 
                          classes=classes,
                          devices=devices,
+                         verified_fingerprints=verified_fingerprints,
                          selected_class=class_filter,
                          search=search)
 
@@ -236,6 +236,8 @@ def student_delete(student_id):
     
     db.session.delete(student)
     db.session.commit()
+    remove_template(student_id)
+    invalidate_attendance_state(student_id)
     
     flash(f'Student {name} deleted successfully!', 'success')
     return redirect(url_for('frontend.students_list'))
@@ -277,9 +279,16 @@ def student_enroll(student_id):
 @bp.route('/classes')
 def classes_list():
     """Classes list page"""
-    classes = Class.query.order_by(Class.name).all()
+    classes = Class.query.options(*Class.dict_options()).order_by(Class.name).all()
     return render_template('classes/list.html', classes=classes)
 
+def update_class_calendar(class_obj):
+    """Regenerate the class's session calendar; total_classes follows it when there is one"""
+    db.session.flush()
+    total = sync_class_sessions(db.session.connection(), class_obj.id, class_obj.start_date, class_obj.end_date)
+    if total:
+        class_obj.total_classes = total
+
 @bp.route('/classes/add', methods=['GET', 'POST'])
 def class_add():
     """Add new class"""
@@ -344,6 +353,7 @@ def class_add():
             if request.form.get(f'schedule_{day}_enabled') == 'on':
                 start_time_str = request.form.get(f'schedule_{day}_start')
                 end_time_str = request.form.get(f'schedule_{day}_end')
+                room = (request.form.get(f'schedule_{day}_room') or '').strip() or None
                 
                 if start_time_str and end_time_str:
                     try:
@@ -357,7 +367,8 @@ def class_add():
                                 class_id=class_obj.id,
                                 day_of_week=day,
                                 start_time=start_time,
-                                end_time=end_time
+                                end_time=end_time,
+                                room=room
                             )
                             db.session.add(schedule)
                             schedule_added = True
@@ -366,7 +377,9 @@ def class_add():
                     except ValueError:
                         flash(f'Error: Invalid time format for {day.capitalize()}', 'error')
         
+        update_class_calendar(class_obj)
         db.session.commit()
+        invalidate_schedule_cache()
         
         if schedule_added:
             flash(f'Class {name} added successfully with schedule!', 'success')
@@ -425,6 +438,7 @@ def class_edit(class_id):
             if request.form.get(f'schedule_{day}_enabled') == 'on':
                 start_time_str = request.form.get(f'schedule_{day}_start')
                 end_time_str = request.form.get(f'schedule_{day}_end')
+                room = (request.form.get(f'schedule_{day}_room') or '').strip() or None
                 
                 if start_time_str and end_time_str:
                     try:
@@ -438,7 +452,8 @@ def class_edit(class_id):
                                 class_id=class_obj.id,
                                 day_of_week=day,
                                 start_time=start_time,
-                                end_time=end_time
+                                end_time=end_time,
+                                room=room
                             )
                             db.session.add(schedule)
                         else:
@@ -446,7 +461,9 @@ def class_edit(class_id):
                     except ValueError:
                         flash(f'Error: Invalid time format for {day.capitalize()}', 'error')
         
+        update_class_calendar(class_obj)
         db.session.commit()
+        invalidate_schedule_cache()
         flash(f'Class {class_obj.name} updated successfully!', 'success')
         return redirect(url_for('frontend.classes_list'))
     
@@ -460,6 +477,8 @@ def class_delete(class_id):
     
     db.session.delete(class_obj)
     db.session.commit()
+    invalidate_schedule_cache()
+    invalidate_attendance_state(class_id=class_id)
     
     flash(f'Class {name} deleted successfully!', 'success')
     return redirect(url_for('frontend.classes_list'))
@@ -491,14 +510,13 @@ def attendance_list():
     if student_filter:
         query = query.filter_by(student_id=student_filter)
     
-    attendances = query.order_by(Attendance.timestamp.desc()).limit(100).all()
+    attendances = query.options(*Attendance.dict_options()).order_by(Attendance.timestamp.desc()).limit(100).all()
     
     classes = Class.query.filter_by(is_active=True).all()
     students = Student.query.order_by(Student.name).all()
     
     # Statistics for current filter
-    total = query.count()
-    present = query.filter_by(status='present').count()
+    counts = status_counts(query)
     
     return render_template('attendance/list.html',
                          attendances=attendances,
@@ -507,13 +525,13 @@ def attendance_list():
                          date_filter=date_filter,
                          class_filter=class_filter,
                          student_filter=student_filter,
-                         total=total,
-                         present=present)
+                         total=counts['total'],
+                         present=counts['present'])
 
 @bp.route('/devices')
 def devices_list():
     """Devices management page"""
-    devices = Device.query.all()
+    devices = heartbeats.apply(Device.query.options(*Device.dict_options()).all())
     classes = Class.query.filter_by(is_active=True).all()
     return render_template('devices/list.html', devices=devices, classes=classes)
 
@@ -560,45 +578,18 @@ def reports():
         start_date_str = start_date.strftime('%Y-%m-%d')
         end_date_str = today.strftime('%Y-%m-%d')
     
-    # Build query
-    query = Attendance.query.filter(
-        Attendance.timestamp >= start_date,
-        Attendance.timestamp < end_date
-    )
-    
-    if class_filter:
-        query = query.filter_by(class_id=class_filter)
-    
-    # Get statistics
-    total_records = query.count()
-    present_count = query.filter_by(status='present').count()
-    absent_count = query.filter_by(status='absent').count()
-    late_count = query.filter_by(status='late').count()
-    
-    # Student-wise attendance
-    student_stats = db.session.query(
-        Student.id,
-        Student.name,
-        db.func.count(Attendance.id).label('total_attendance')
-    ).join(Attendance).filter(
-        Attendance.timestamp >= start_date,
-        Attendance.timestamp < end_date
-    )
-    
-    if class_filter:
-        student_stats = student_stats.filter(Attendance.class_id == class_filter)
-    
-    student_stats = student_stats.group_by(Student.id).order_by(
-        db.func.count(Attendance.id).desc()
-    ).limit(10).all()
+    # Totals from the daily summary: cost follows the number of days, not scans
+    first_day, end_day = day_range(start_date, end_date)
+    counts = summary_status_counts(first_day, end_day, class_filter)
+    student_stats = summary_top_students(first_day, end_day, class_filter)
     
     classes = Class.query.filter_by(is_active=True).all()
     
     return render_template('reports/index.html',
-                         total_records=total_records,
-                         present_count=present_count,
-                         absent_count=absent_count,
-                         late_count=late_count,
+                         total_records=counts['total'],
+                         present_count=counts['present'],
+                         absent_count=counts['absent'],
+                         late_count=counts['late'],
                          student_stats=student_stats,
                          classes=classes,
                          start_date=start_date_str,
@@ -613,58 +604,12 @@ def class_attendance_report(class_id):
     # Get max marks from query parameter (default 10)
     max_marks = request.args.get('max_marks', default=10, type=float)
     
-    # Get all students in this class
-    students = Student.query.filter_by(class_id=class_id).order_by(Student.name).all()
-    
-    # Calculate attendance data for each student
-    attendance_data = []
-    total_attendance_sum = 0
-    total_duration_sum = 0
-    total_duration_count = 0
-    
-    for student in students:
-        # Get all attendance records for this student in this class
-        attendance_records = Attendance.query.filter_by(
-            student_id=student.id,
-            class_id=class_id
-        ).all()
-        
-        # Count classes attended (only count records with exit_time as completed)
-        classes_attended = sum(1 for att in attendance_records if att.exit_time)
-        
-        # Calculate average duration (only for completed attendances)
-        durations = [att.duration_minutes for att in attendance_records if att.duration_minutes]
-        avg_duration = sum(durations) / len(durations) if durations else 0
-        
-        if durations:
-            total_duration_sum += sum(durations)
-            total_duration_count += len(durations)
-        
-        # Calculate attendance percentage
-        total_classes = class_obj.total_classes or 1  # Avoid division by zero
-        attendance_percentage = (classes_attended / total_classes) * 100 if total_classes > 0 else 0
-        
-        # Calculate marks based on attendance percentage
-        marks = (attendance_percentage / 100) * max_marks
-        
-        total_attendance_sum += attendance_percentage
-        
-        attendance_data.append({
-            'student': student,
-            'classes_attended': classes_attended,
-            'avg_duration': avg_duration,
-            'attendance_percentage': attendance_percentage,
-            'marks': marks
-        })
-    
-    # Calculate overall statistics
-    class_average = total_attendance_sum / len(students) if students else 0
-    avg_duration = total_duration_sum / total_duration_count if total_duration_count > 0 else 0
+    report = build_class_report(class_obj, max_marks)
     
     return render_template('reports/class_attendance.html',
                          class_obj=class_obj,
-                         students=students,
-                         attendance_data=attendance_data,
+                         students=report['students'],
+                         attendance_data=report['attendance_data'],
                          max_marks=max_marks,
-                         class_average=class_average,
-                         avg_duration=avg_duration)
+                         class_average=report['class_average'],
+                         avg_duration=report['avg_duration'])
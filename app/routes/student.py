@@ -1,21 +1,38 @@
 """
 Student Management Routes
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models import Student, Command, Device
+from app.matching import remove_template
+from app.utils.attendance_state import invalidate_attendance_state
+from app.utils.pagination import Keyset, page_args, stream_json
 
 bp = Blueprint('students', __name__, url_prefix='/api/students')
 
 @bp.route('/', methods=['GET'])
 def list_students():
-    """List all students"""
+    """List students (all by name, or paged by id with ``limit`` / ``cursor`` / ``stream=true``)"""
     class_id = request.args.get('class_id', type=int)
     
     query = Student.query
     if class_id:
         query = query.filter_by(class_id=class_id)
     
+    if {'limit', 'cursor', 'stream'} & request.args.keys():
+        cursor, limit, stream = page_args(request.args, 100, current_app.config.get('API_MAX_PAGE_SIZE', 1000))
+        keyset = Keyset(Student.id)
+        try:
+            if stream:
+                return stream_json('students', keyset.iter_rows(query, cursor), Student.to_dict)
+            students, next_cursor = keyset.page(query, cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'students': [student.to_dict() for student in students],
+            'next_cursor': next_cursor
+        }), 200
+    
     students = query.order_by(Student.name).all()
     return jsonify({
         'students': [student.to_dict() for student in students]
@@ -112,6 +129,8 @@ def delete_student(student_id):
     
     db.session.delete(student)
     db.session.commit()
+    remove_template(student_id)
+    invalidate_attendance_state(student_id)
     
     return jsonify({'message': 'Student deleted successfully'}), 200
 
@@ -0,0 +1,244 @@
+"""
+Session-end absence marking
+
+Nothing used to write the 'absent' status, so absent counts were always
+zero and entries without an exit scan stayed open forever. When a class
+session (class_sessions, see app/utils/class_sessions.py) ends, this job:
+
+- closes the entries still waiting for an exit scan at the session's end
+  time (one SELECT ... FOR UPDATE and one executemany UPDATE);
+- gives every student enrolled in the class with no attendance row for it
+  that day an 'absent' row (one INSERT ... SELECT), and adds their summary
+  rows with a second INSERT ... SELECT over exactly the rows just written.
+
+So a session costs a handful of statements however many students it has.
+
+A session is claimed by setting class_sessions.closed_at in the same
+transaction (UPDATE ... WHERE closed_at IS NULL), so it is closed exactly
+once however many worker processes run the job, and sessions that ended
+while the server was down are caught up on the next pass. Only sessions in
+the generated calendar are closed: classes without a start and end date are
+never marked, and sessions of inactive classes are claimed without marking
+anyone.
+
+Each serving process starts the job thread on its first request; it sleeps
+until the next session end, at most ABSENCE_JOB_SECONDS at a time so
+schedule edits are picked up (0 disables the job).
+"""
+import logging
+import threading
+from datetime import datetime, time, timedelta
+from sqlalchemy import Date, DateTime, Integer, String, bindparam, func, literal, select
+
+from app.utils.attendance_state import invalidate_attendance_state
+from app.utils.class_sessions import ended_by
+from app.utils.daily_summary import COUNTS, add_contribution, write_deltas
+from app.utils.stats_cache import mark_tables_changed
+from app.utils.timezone import get_naive_now
+
+
+def missing_exit_note(ends_at):
+    """Notes for an entry closed at the session end because no exit scan came"""
+    return f"No exit scan; closed at session end {ends_at.strftime('%H:%M:%S')}"
+
+
+def close_session(session, row, now, mark=True):
+    """Close one ended class session ``row`` (id, class_id, session_date, end_time) on ``session``
+
+    Returns {'session_id', 'class_id', 'absent', 'closed'} or None if
+    another worker closed it first. The caller commits.
+    """
+    from app.models import Attendance, ClassSession, DailyAttendanceSummary, Student
+
+    conn = session.connection()
+    sessions = ClassSession.__table__
+    claimed = conn.execute(sessions.update().where(
+        sessions.c.id == row.id, sessions.c.closed_at.is_(None)
+    ).values(closed_at=now))
+    if claimed.rowcount == 0:
+        return None
+
+    result = {'session_id': row.id, 'class_id': row.class_id, 'absent': 0, 'closed': 0}
+    if not mark:
+        return result
+
+    attendance = Attendance.__table__
+    day_start = datetime.combine(row.session_date, time.min)
+    that_day = [
+        attendance.c.class_id == row.class_id,
+        attendance.c.timestamp >= day_start,
+        attendance.c.timestamp < day_start + timedelta(days=1)
+    ]
+    ends_at = datetime.combine(row.session_date, row.end_time)
+
+    # Entries with no exit scan: exit at the session end
+    dangling = conn.execute(select(
+        attendance.c.id, attendance.c.timestamp, attendance.c.student_id,
+        attendance.c.status, attendance.c.entry_time
+    ).where(
+        *that_day, attendance.c.entry_time.isnot(None), attendance.c.exit_time.is_(None)
+    ).with_for_update()).all()
+    if dangling:
+        closes, deltas = [], {}
+        for entry in dangling:
+            duration = max(int((ends_at - entry.entry_time).total_seconds() / 60), 0)
+            closes.append({'b_id': entry.id, 'b_duration': duration})
+            before = {'timestamp': entry.timestamp, 'class_id': row.class_id, 'student_id': entry.student_id,
+                      'status': entry.status, 'exit_time': None, 'duration_minutes': None}
+            add_contribution(deltas, before, -1)
+            add_contribution(deltas, dict(before, exit_time=ends_at, duration_minutes=duration))
+        conn.execute(attendance.update().where(attendance.c.id == bindparam('b_id')).values(
+            exit_time=ends_at,
+            duration_minutes=bindparam('b_duration'),
+            notes=missing_exit_note(ends_at)
+        ), closes)
+        write_deltas(conn, deltas)
+        result['closed'] = len(closes)
+
+    # Enrolled students not seen at all that day: absent
+    students = Student.__table__
+    seen = select(attendance.c.id).where(attendance.c.student_id == students.c.id, *that_day).exists()
+    inserted = conn.execute(attendance.insert().from_select(
+        ['student_id', 'class_id', 'status', 'timestamp', 'notes'],
+        select(
+            students.c.id,
+            literal(row.class_id, Integer),
+            literal('absent', String),
+            literal(ends_at, DateTime),
+            literal('Marked absent at session end', String)
+        ).where(students.c.class_id == row.class_id, ~seen)
+    ).execution_options(preserve_rowcount=True))
+    result['absent'] = max(inserted.rowcount, 0)
+
+    if result['absent']:
+        # Summary rows for exactly the rows just inserted (no other row has this timestamp and no entry)
+        summary = DailyAttendanceSummary.__table__
+        counts = {name: 0 for name in COUNTS}
+        counts.update(total_count=1, absent_count=1)
+        conn.execute(summary.insert().from_select(
+            ['day', 'class_id', 'student_id', *counts],
+            select(
+                literal(row.session_date, Date),
+                literal(row.class_id, Integer),
+                attendance.c.student_id,
+                *[literal(value, Integer) for value in counts.values()]
+            ).where(
+                attendance.c.class_id == row.class_id,
+                attendance.c.timestamp == ends_at,
+                attendance.c.status == 'absent',
+                attendance.c.entry_time.is_(None)
+            )
+        ))
+
+    if result['absent'] or result['closed']:
+        mark_tables_changed(session, 'attendance')
+    return result
+
+
+def close_ended_sessions(now=None):
+    """Close every class session that has ended and isn't closed yet; returns the results"""
+    from app import db
+    from app.models import Class, ClassSession
+
+    now = now or get_naive_now()
+    sessions, classes = ClassSession.__table__, Class.__table__
+    due = db.session.execute(select(
+        sessions.c.id, sessions.c.class_id, sessions.c.session_date, sessions.c.end_time, classes.c.is_active
+    ).join(classes, classes.c.id == sessions.c.class_id).where(
+        sessions.c.closed_at.is_(None), ended_by(now)
+    ).order_by(sessions.c.session_date, sessions.c.end_time)).all()
+
+    results = []
+    for row in due:
+        try:
+            result = close_session(db.session, row, now, mark=bool(row.is_active))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.warning(f"Closing class session {row.id} failed, will retry: {e}")
+            continue
+        if result is None:
+            continue
+        invalidate_attendance_state(class_id=row.class_id)
+        logging.info(f"Closed class session {row.id} (class {row.class_id}, {row.session_date}): "
+                     f"{result['absent']} absent, {result['closed']} entries closed")
+        results.append(result)
+    return results
+
+
+def next_session_end(now):
+    """Datetime of the next unclosed session end later today, or None"""
+    from app import db
+    from app.models import ClassSession
+
+    sessions = ClassSession.__table__
+    end_time = db.session.execute(select(func.min(sessions.c.end_time)).where(
+        sessions.c.closed_at.is_(None),
+        sessions.c.session_date == now.date(),
+        sessions.c.end_time > now.time()
+    )).scalar()
+    return datetime.combine(now.date(), end_time) if end_time else None
+
+
+class AbsenceJob:
+    """Background thread closing class sessions as they end"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.passes = 0
+        self.sessions_closed = 0
+
+    def start(self, app, interval):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(app, interval), name='absence-job', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, app, interval):
+        from app import db
+
+        while not self._stop.is_set():
+            wait = interval
+            with app.app_context():
+                try:
+                    closed = close_ended_sessions()
+                    self.passes += 1
+                    self.sessions_closed += len(closed)
+                    now = get_naive_now()
+                    next_end = next_session_end(now)
+                    if next_end is not None:
+                        wait = min(interval, max((next_end - now).total_seconds(), 1))
+                except Exception as e:
+                    logging.warning(f"Absence job pass failed: {e}")
+                finally:
+                    db.session.remove()
+            self._stop.wait(wait)
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'passes': self.passes,
+            'sessions_closed': self.sessions_closed
+        }
+
+
+absence_job = AbsenceJob()
+
+
+def register_absence_job(app):
+    """Start the absence job in each serving process on its first request (not in CLI scripts)"""
+    interval = app.config.get('ABSENCE_JOB_SECONDS', 60)
+    if not interval or app.testing:
+        return
+
+    @app.before_request
+    def start_absence_job():
+        if not absence_job.stats()['running']:
+            absence_job.start(app, interval)
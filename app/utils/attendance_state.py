@@ -0,0 +1,197 @@
+"""
+Per-student attendance state cache
+
+Keeps one small state record per (student, class, day): the last scan time,
+the open entry (if any) and the completed entry/exit (if any). Entry, exit,
+cooldown and already-recorded decisions are made from that record, and the
+verify route only writes through to the database. A cache miss costs one
+query over the student's rows for that class and day, replacing the three
+separate cooldown / completed / pending-entry queries.
+
+Records expire after ATTENDANCE_STATE_TTL seconds so scans handled by another
+worker process are picked up; routes that write attendance outside the scan
+path call invalidate_attendance_state(). Batches of buffered scans load all
+their states in one query with load_many() and apply the same rules.
+"""
+import threading
+import time as clock
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+COOLDOWN = timedelta(minutes=3)
+LATE_AFTER = timedelta(minutes=5)  # Grace period after class start before an entry counts as late
+
+
+def entry_status(class_start_time, at):
+    """('present' | 'late', minutes late) for an entry at ``at`` into a class starting at ``class_start_time``"""
+    late_by = at - datetime.combine(at.date(), class_start_time)
+    if late_by > LATE_AFTER:
+        return 'late', int(late_by.total_seconds() / 60)
+    return 'present', 0
+
+
+class ScanState:
+    """What has happened for one student in one class on one day"""
+
+    __slots__ = ('last_scan', 'open_entry', 'completed', 'marked_absent', 'loaded_at')
+
+    def __init__(self):
+        self.last_scan = None  # Latest Attendance.timestamp
+        self.open_entry = None  # {'id', 'timestamp', 'entry_time', 'status'} of the entry without exit
+        self.completed = None  # {'id', 'entry_time', 'exit_time', 'duration_minutes'}
+        self.marked_absent = None  # {'id', 'timestamp'} of an absent row with no scan behind it
+        self.loaded_at = clock.monotonic()
+
+    def apply_row(self, row):
+        """Fold one attendance row (oldest first) into the state"""
+        if row.status == 'absent' and row.entry_time is None:
+            # Written by the session-end absence job, not a scan
+            if self.marked_absent is None:
+                self.marked_absent = {'id': row.id, 'timestamp': row.timestamp}
+            return
+        if row.timestamp and (self.last_scan is None or row.timestamp > self.last_scan):
+            self.last_scan = row.timestamp
+        if row.entry_time and row.exit_time:
+            if self.completed is None:
+                self.completed = {
+                    'id': row.id,
+                    'entry_time': row.entry_time,
+                    'exit_time': row.exit_time,
+                    'duration_minutes': row.duration_minutes
+                }
+        elif row.exit_time is None and self.open_entry is None:
+            self.open_entry = {'id': row.id, 'timestamp': row.timestamp, 'entry_time': row.entry_time, 'status': row.status}
+
+    def decide(self, now):
+        """One of 'cooldown', 'completed', 'exit' or 'entry' for a scan at ``now``"""
+        if self.last_scan is not None and self.last_scan >= now - COOLDOWN:
+            return 'cooldown'
+        if self.completed is not None:
+            return 'completed'
+        if self.open_entry is not None:
+            return 'exit'
+        return 'entry'
+
+    def record_entry(self, attendance_id, now, status):
+        self.last_scan = now
+        self.open_entry = {'id': attendance_id, 'timestamp': now, 'entry_time': now, 'status': status}
+
+    def record_exit(self, now, duration_minutes):
+        entry = self.open_entry
+        self.open_entry = None
+        self.completed = {
+            'id': entry['id'],
+            'entry_time': entry['entry_time'],
+            'exit_time': now,
+            'duration_minutes': duration_minutes
+        }
+
+
+def _fold(rows, day_start):
+    """ScanState from one student's rows for a class (oldest first) up to the end of ``day_start``'s day"""
+    state = ScanState()
+    for row in rows:
+        if row.timestamp >= day_start:
+            state.apply_row(row)
+        elif state.last_scan is None or row.timestamp > state.last_scan:
+            # Just before midnight: only counts towards the cooldown
+            state.last_scan = row.timestamp
+    return state
+
+
+class AttendanceStateCache:
+    """LRU of ScanState records keyed by (student_id, class_id, day)"""
+
+    def __init__(self, max_entries=50000):
+        self._lock = threading.Lock()
+        self._states = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, student_id, class_id, now, ttl=60):
+        """State for a scan at ``now``, loading it from the database on a miss or expiry"""
+        key = (student_id, class_id, now.date())
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None and clock.monotonic() - state.loaded_at < ttl:
+                self._states.move_to_end(key)
+                return state
+
+        state = self._load(student_id, class_id, now)
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+        return state
+
+    def _load(self, student_id, class_id, now):
+        from app.models import Attendance
+
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        rows = Attendance.query.with_entities(
+            Attendance.id, Attendance.timestamp, Attendance.entry_time,
+            Attendance.exit_time, Attendance.duration_minutes, Attendance.status
+        ).filter(
+            Attendance.student_id == student_id,
+            Attendance.class_id == class_id,
+            Attendance.timestamp >= min(day_start, now - COOLDOWN)
+        ).order_by(Attendance.timestamp, Attendance.id).all()
+
+        return _fold(rows, day_start)
+
+    def load_many(self, keys):
+        """Fresh states for many (student_id, class_id, day) keys from one query (not cached)
+
+        For batches of scans: the caller applies decide() / record_*() to
+        its own copies and forget()s the keys once its writes commit.
+        """
+        from app.models import Attendance
+
+        keys = set(keys)
+        if not keys:
+            return {}
+        first = datetime.combine(min(key[2] for key in keys), datetime.min.time())
+        last = datetime.combine(max(key[2] for key in keys), datetime.min.time()) + timedelta(days=1)
+        rows = Attendance.query.with_entities(
+            Attendance.id, Attendance.student_id, Attendance.class_id, Attendance.timestamp,
+            Attendance.entry_time, Attendance.exit_time, Attendance.duration_minutes, Attendance.status
+        ).filter(
+            Attendance.student_id.in_({key[0] for key in keys}),
+            Attendance.class_id.in_({key[1] for key in keys}),
+            Attendance.timestamp >= first - COOLDOWN,
+            Attendance.timestamp < last
+        ).order_by(Attendance.timestamp, Attendance.id).all()
+
+        grouped = {key: [] for key in keys}
+        for row in rows:
+            day = row.timestamp.date()
+            if (row.student_id, row.class_id, day) in grouped:
+                grouped[(row.student_id, row.class_id, day)].append(row)
+            next_day = (row.student_id, row.class_id, day + timedelta(days=1))
+            if next_day in grouped and row.timestamp >= datetime.combine(next_day[2], datetime.min.time()) - COOLDOWN:
+                grouped[next_day].append(row)
+        return {key: _fold(rows, datetime.combine(key[2], datetime.min.time())) for key, rows in grouped.items()}
+
+    def forget(self, keys):
+        """Drop the cached states of specific (student_id, class_id, day) keys"""
+        with self._lock:
+            for key in keys:
+                self._states.pop(key, None)
+
+    def invalidate(self, student_id=None, class_id=None):
+        """Drop cached states for a student and/or class (everything if neither given)"""
+        with self._lock:
+            if student_id is None and class_id is None:
+                self._states.clear()
+                return
+            for key in list(self._states):
+                if (student_id is None or key[0] == student_id) and (class_id is None or key[1] == class_id):
+                    del self._states[key]
+
+
+attendance_state = AttendanceStateCache()
+
+
+def invalidate_attendance_state(student_id=None, class_id=None):
+    """Call after writing attendance rows outside the verify route"""
+    attendance_state.invalidate(student_id, class_id)
@@ -0,0 +1,61 @@
+"""
+Bulk row inserts
+
+bulk_insert() writes many rows of one table inside the current session
+transaction. On PostgreSQL with psycopg 3 it streams them with
+``COPY ... FROM STDIN`` (one round trip, no per-row statement parsing);
+everywhere else it is a single executemany INSERT. Python-side column
+defaults (e.g. ``timestamp=get_naive_now``) are filled in first, since COPY
+bypasses SQLAlchemy. Rows are plain dicts keyed by column name; no ORM
+objects are created and no IDs are returned.
+"""
+from app import db
+from app.utils.stats_cache import mark_tables_changed
+from app.utils.daily_summary import record_attendance_rows
+
+
+def _with_defaults(table, rows):
+    """Rows as lists in a fixed column order, Python-side scalar/callable defaults applied"""
+    keys = list(dict.fromkeys(key for row in rows for key in row))
+    defaults = [
+        column for column in table.columns
+        if column.name not in keys and not column.primary_key and column.default is not None
+        and (column.default.is_scalar or column.default.is_callable)
+    ]
+    names = keys + [column.name for column in defaults]
+
+    values = []
+    for row in rows:
+        resolved = [row.get(key) for key in keys]
+        for column in defaults:
+            default = column.default
+            resolved.append(default.arg(None) if default.is_callable else default.arg)
+        values.append(resolved)
+    return names, values
+
+
+def bulk_insert(table, rows, session=None):
+    """Insert ``rows`` (dicts) into a Table or model; returns the number of rows written"""
+    table = getattr(table, '__table__', table)
+    rows = list(rows)
+    if not rows:
+        return 0
+
+    session = session or db.session
+    connection = session.connection()
+    names, values = _with_defaults(table, rows)
+
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg':
+        quote = connection.dialect.identifier_preparer.quote
+        sql = f'COPY {quote(table.name)} ({", ".join(quote(n) for n in names)}) FROM STDIN'
+        driver_connection = connection.connection.driver_connection
+        with driver_connection.cursor() as cursor:
+            with cursor.copy(sql) as copy:
+                for row in values:
+                    copy.write_row(row)
+    else:
+        connection.execute(table.insert(), [dict(zip(names, row)) for row in values])
+    if table.name == 'attendance':
+        record_attendance_rows(session, [dict(zip(names, row)) for row in values])
+    mark_tables_changed(session, table.name)
+    return len(rows)
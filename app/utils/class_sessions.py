@@ -0,0 +1,92 @@
+"""
+Class session calendar
+
+class_sessions holds every concrete meeting of a class: each date from
+start_date through end_date whose weekday has a ClassSchedule, with that
+day's times. Counting sessions, finding the sessions held so far and
+building absence matrices then become joins against this table instead of
+walking the date range against the weekly schedule in Python.
+
+sync_class_sessions() is called whenever a class's dates or schedules
+change (class add / edit). It diffs the wanted calendar against the stored
+one and only inserts and deletes the difference, so unchanged sessions keep
+their ids. Sessions before today are history: once a class has a calendar,
+a schedule edit only regenerates today onwards, and past sessions are only
+dropped when they fall outside the class's new date range. Sessions that
+have already ended when they are generated (a class added with a past start
+date) are stored as closed, so the absence job doesn't mark everyone absent
+for meetings nobody was scanned at.
+"""
+from datetime import timedelta
+from sqlalchemy import and_, or_, select
+
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']  # date.weekday() order
+
+
+def scheduled_occurrences(start_date, end_date, schedules):
+    """{date: (start_time, end_time)} for every scheduled weekday from start_date to end_date inclusive"""
+    by_weekday = {DAYS.index(s.day_of_week): (s.start_time, s.end_time) for s in schedules if s.day_of_week in DAYS}
+    occurrences = {}
+    if not (start_date and end_date and by_weekday):
+        return occurrences
+    day = start_date
+    while day <= end_date:
+        if day.weekday() in by_weekday:
+            occurrences[day] = by_weekday[day.weekday()]
+        day += timedelta(days=1)
+    return occurrences
+
+
+def ended_by(now):
+    """Filter for sessions whose end time has passed at ``now``"""
+    from app.models import ClassSession
+
+    sessions = ClassSession.__table__
+    return or_(
+        sessions.c.session_date < now.date(),
+        and_(sessions.c.session_date == now.date(), sessions.c.end_time <= now.time())
+    )
+
+
+def sync_class_sessions(conn, class_id, start_date, end_date, now=None):
+    """Bring class ``class_id``'s sessions in line with its dates and schedules on ``conn``
+
+    Returns the number of sessions in the calendar afterwards.
+    """
+    from app.models import ClassSchedule, ClassSession
+    from app.utils.timezone import get_naive_now
+
+    now = now or get_naive_now()
+    today = now.date()
+    schedules = ClassSchedule.__table__
+    sessions = ClassSession.__table__
+
+    wanted = scheduled_occurrences(start_date, end_date, conn.execute(
+        select(schedules.c.day_of_week, schedules.c.start_time, schedules.c.end_time)
+        .where(schedules.c.class_id == class_id)
+    ).all())
+    stored = {row.session_date: row for row in conn.execute(
+        select(sessions.c.id, sessions.c.session_date, sessions.c.start_time, sessions.c.end_time)
+        .where(sessions.c.class_id == class_id)
+    )}
+    has_history = bool(stored)
+
+    stale = []
+    for day, row in stored.items():
+        if start_date is None or end_date is None or not start_date <= day <= end_date:
+            stale.append(row.id)
+        elif day >= today and wanted.get(day) != (row.start_time, row.end_time):
+            stale.append(row.id)
+    if stale:
+        conn.execute(sessions.delete().where(sessions.c.id.in_(stale)))
+
+    kept = {day for day, row in stored.items() if row.id not in stale}
+    new = [
+        {'class_id': class_id, 'session_date': day, 'start_time': times[0], 'end_time': times[1],
+         'closed_at': now if (day, times[1]) <= (today, now.time()) else None}
+        for day, times in sorted(wanted.items())
+        if day not in kept and (day >= today or not has_history)
+    ]
+    if new:
+        conn.execute(sessions.insert(), new)
+    return len(kept) + len(new)
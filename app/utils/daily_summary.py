@@ -0,0 +1,188 @@
+"""
+Incremental maintenance of daily_attendance_summary
+
+Each attendance row contributes to exactly one summary row, keyed by
+(date of timestamp, class_id, student_id): one to total_count and to the
+count for its status, one to completed_count once it has an exit, and its
+duration to duration_minutes / timed_count when that is non-zero. Every write
+to attendance turns into a delta (new contribution minus old) applied to
+that key inside the same transaction, so the summary commits or rolls back
+together with the rows it describes:
+
+- ORM inserts, deletes and updates (manual marks, entry scans, deletes,
+  student / class deletes) are picked up by the session hook below;
+- writes that bypass the ORM - the exit scan's UPDATE and bulk_insert() -
+  call record_attendance_change() / record_attendance_rows() themselves.
+
+rebuild_daily_summary() recomputes the table (or a date range of it) from
+the attendance table in one INSERT ... SELECT, for backfill and repair.
+"""
+from datetime import datetime, time, timedelta
+from sqlalchemy import bindparam, case, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+COUNTS = ('total_count', 'present_count', 'late_count', 'absent_count',
+          'completed_count', 'duration_minutes', 'timed_count')
+FIELDS = ('timestamp', 'class_id', 'student_id', 'status', 'exit_time', 'duration_minutes')
+STATUS_COUNTS = {'present': 'present_count', 'late': 'late_count', 'absent': 'absent_count'}
+
+
+def _summary_table():
+    from app.models import DailyAttendanceSummary
+    return DailyAttendanceSummary.__table__
+
+
+def add_contribution(deltas, row, sign=1):
+    """Add (or with sign=-1 remove) one attendance row, a mapping of FIELDS, to ``deltas``"""
+    if row.get('timestamp') is None or row.get('student_id') is None:
+        return
+    key = (row['timestamp'].date(), row.get('class_id'), row['student_id'])
+    counts = deltas.setdefault(key, dict.fromkeys(COUNTS, 0))
+    counts['total_count'] += sign
+    if row.get('status') in STATUS_COUNTS:
+        counts[STATUS_COUNTS[row['status']]] += sign
+    if row.get('exit_time') is not None:
+        counts['completed_count'] += sign
+    if row.get('duration_minutes'):
+        counts['duration_minutes'] += sign * row['duration_minutes']
+        counts['timed_count'] += sign
+
+
+def _existing_rows(conn, keys, chunk=500):
+    """{key: id of its summary row} for the ``keys`` that have one (the lowest id if several)"""
+    table = _summary_table()
+    students_by_day = {}
+    for day, _, student_id in keys:
+        students_by_day.setdefault(day, set()).add(student_id)
+
+    existing = {}
+    for day, student_ids in students_by_day.items():
+        student_ids = sorted(student_ids)
+        for i in range(0, len(student_ids), chunk):
+            rows = conn.execute(select(
+                func.min(table.c.id), table.c.class_id, table.c.student_id
+            ).where(
+                table.c.day == day, table.c.student_id.in_(student_ids[i:i + chunk])
+            ).group_by(table.c.class_id, table.c.student_id))
+            for row_id, class_id, student_id in rows:
+                existing[(day, class_id, student_id)] = row_id
+    return existing
+
+
+def write_deltas(conn, deltas):
+    """Apply ``deltas`` ({key: counts}) to the summary table on ``conn``
+
+    Existing rows are found with a few IN queries, then every update goes
+    out as one executemany UPDATE and every new key as one executemany
+    INSERT, so a large batch doesn't cost a statement per key.
+    """
+    table = _summary_table()
+    changes = {key: counts for key, counts in deltas.items() if any(counts.values())}
+    if not changes:
+        return
+    existing = _existing_rows(conn, changes)
+
+    updates, inserts = [], []
+    for key, counts in changes.items():
+        if key in existing:
+            # Update a single row for the key, so a duplicate can't take the delta twice
+            updates.append({'b_id': existing[key], **{f'b_{name}': value for name, value in counts.items()}})
+        else:
+            day, class_id, student_id = key
+            inserts.append({'day': day, 'class_id': class_id, 'student_id': student_id, **counts})
+    if updates:
+        conn.execute(table.update().where(table.c.id == bindparam('b_id')).values(
+            {name: table.c[name] + bindparam(f'b_{name}') for name in COUNTS}
+        ), updates)
+    if inserts:
+        conn.execute(table.insert(), inserts)
+
+
+def record_attendance_change(session, before=None, after=None):
+    """Summary delta for a write the ORM doesn't see: row ``before`` replaced by ``after``"""
+    deltas = {}
+    if before is not None:
+        add_contribution(deltas, before, -1)
+    if after is not None:
+        add_contribution(deltas, after)
+    write_deltas(session.connection(), deltas)
+
+
+def record_attendance_rows(session, rows):
+    """Summary deltas for rows inserted without the ORM (bulk_insert)"""
+    deltas = {}
+    for row in rows:
+        add_contribution(deltas, row)
+    write_deltas(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_flush')
+def _summarize_attendance_writes(session, flush_context):
+    from app.models import Attendance
+
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Attendance):
+            add_contribution(deltas, {field: getattr(obj, field) for field in FIELDS})
+    for obj in session.deleted:
+        if isinstance(obj, Attendance):
+            add_contribution(deltas, {field: getattr(obj, field) for field in FIELDS}, -1)
+    for obj in session.dirty:
+        if isinstance(obj, Attendance):
+            state = inspect(obj)
+            history = {field: state.attrs[field].history for field in FIELDS}
+            if not any(h.deleted for h in history.values()):
+                continue
+            after = {field: getattr(obj, field) for field in FIELDS}
+            before = {field: h.deleted[0] if h.deleted else after[field] for field, h in history.items()}
+            add_contribution(deltas, before, -1)
+            add_contribution(deltas, after)
+    if deltas:
+        write_deltas(session.connection(), deltas)
+
+
+def rebuild_daily_summary(conn, start=None, end=None):
+    """Recompute summary rows for days in [start, end) (dates; None = unbounded) from attendance
+
+    Returns the number of summary rows written.
+    """
+    from app.models import Attendance
+
+    table = _summary_table()
+    attendance = Attendance.__table__
+
+    day_filter, time_filter = [], []
+    if start is not None:
+        day_filter.append(table.c.day >= start)
+        time_filter.append(attendance.c.timestamp >= datetime.combine(start, time.min))
+    if end is not None:
+        day_filter.append(table.c.day < end)
+        time_filter.append(attendance.c.timestamp < datetime.combine(end, time.min))
+    conn.execute(table.delete().where(*day_filter))
+
+    day = func.date(attendance.c.timestamp)
+    timed = case((attendance.c.duration_minutes != 0, attendance.c.duration_minutes))
+    source = select(
+        day,
+        attendance.c.class_id,
+        attendance.c.student_id,
+        func.count(attendance.c.id),
+        *[func.count(case((attendance.c.status == status, 1))) for status in STATUS_COUNTS],
+        func.count(attendance.c.exit_time),
+        func.coalesce(func.sum(timed), 0),
+        func.count(timed)
+    ).where(
+        attendance.c.timestamp.isnot(None), *time_filter
+    ).group_by(day, attendance.c.class_id, attendance.c.student_id)
+
+    columns = ['day', 'class_id', 'student_id', 'total_count',
+               *STATUS_COUNTS.values(), 'completed_count', 'duration_minutes', 'timed_count']
+    # preserve_rowcount: psycopg otherwise reports -1 for INSERT ... SELECT
+    result = conn.execute(table.insert().from_select(columns, source).execution_options(preserve_rowcount=True))
+    return result.rowcount
+
+
+def day_range(start_date, end_date):
+    """[start, end) dates covering datetimes from ``start_date`` up to (not including) ``end_date``"""
+    end = end_date.date() if end_date.time() == time.min else end_date.date() + timedelta(days=1)
+    return start_date.date(), end
@@ -0,0 +1,69 @@
+"""
+Database backend selection
+
+The app runs on SQLite (single file, the default) or PostgreSQL, chosen by
+DATABASE_URL. Engine options differ per backend - SQLite takes a driver
+lock timeout, PostgreSQL a client pool, connect timeout and statement
+timeout - so the config keeps one dict per backend and create_app() merges
+the one matching the URL into SQLALCHEMY_ENGINE_OPTIONS before the engine
+is created.
+
+Relative SQLite paths are resolved under the instance folder by
+Flask-SQLAlchemy, so DATABASE_URL=sqlite:///instance/x.db means
+instance/instance/x.db. check_sqlite_location() warns at startup when that
+kind of mistake would silently start the app on a new, empty database.
+"""
+import logging
+import os
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+
+def backend_name(uri):
+    """'sqlite', 'postgresql', ... for a database URI"""
+    return make_url(uri).get_backend_name()
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database backend"""
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    backend = backend_name(uri)
+    options = {}
+
+    if backend == 'sqlite':
+        # In-memory databases get a single static connection from Flask-SQLAlchemy
+        if make_url(uri).database not in (None, '', ':memory:'):
+            options.update(config.get('SQLITE_ENGINE_OPTIONS') or {})
+    elif backend == 'postgresql':
+        options.update(config.get('POSTGRES_ENGINE_OPTIONS') or {})
+        if config.get('DB_PGBOUNCER'):
+            # PgBouncer pools server-side; transaction pooling can't keep prepared statements
+            for key in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle'):
+                options.pop(key, None)
+            options['poolclass'] = NullPool
+            connect_args = dict(options.get('connect_args') or {})
+            connect_args['prepare_threshold'] = None
+            options['connect_args'] = connect_args
+
+    # Explicit SQLALCHEMY_ENGINE_OPTIONS win
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def check_sqlite_location(app):
+    """Warn if the SQLite file the app will open doesn't exist but one of that name is in instance/
+
+    Returns the resolved path (None for other backends and in-memory databases).
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    path = url.database if os.path.isabs(url.database) else os.path.join(app.instance_path, url.database)
+    existing = os.path.join(app.instance_path, os.path.basename(url.database))
+    if not os.path.exists(path) and os.path.normpath(existing) != os.path.normpath(path) and os.path.exists(existing):
+        logging.warning(
+            f"SQLite database {path} does not exist and will be created empty, but {existing} does. "
+            f"Relative sqlite:/// paths are resolved inside the instance folder: "
+            f"use DATABASE_URL=sqlite:///{os.path.basename(url.database)} to keep using it."
+        )
+    return path
@@ -0,0 +1,53 @@
+"""
+Per-device change notifications
+
+Long-polling device requests (/api/device/poll, /api/device/mode with
+``wait``) park on the event bus topic ``device:<device_id>`` and are woken
+when something they care about is committed:
+
+    command   a Command was created for the device
+    mode      the device's mode or pinned class changed
+
+Notifications come from session events rather than from each route, so
+every place that creates commands or changes modes (API, web pages,
+command completion) wakes the device without remembering to. They are sent
+after commit, so a woken request always finds the new row.
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.utils.event_bus import publish
+
+
+def device_topic(device_id):
+    return f'device:{device_id}'
+
+
+def notify_device(device_id, reason):
+    """Wake long-polls waiting on ``device_id`` in this process"""
+    publish(device_topic(device_id), {'reason': reason})
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_device_changes(session, flush_context):
+    from app.models import Command, Device
+
+    pending = session.info.setdefault('device_notifications', set())
+    for obj in session.new:
+        if isinstance(obj, Command) and obj.status == 'pending':
+            pending.add((obj.device_id, 'command'))
+    for obj in session.dirty:
+        if isinstance(obj, Device):
+            state = inspect(obj)
+            if state.attrs.mode.history.has_changes() or state.attrs.current_class_id.history.has_changes():
+                pending.add((obj.device_id, 'mode'))
+
+
+@event.listens_for(Session, 'after_commit')
+def _send_device_notifications(session):
+    for device_id, reason in session.info.pop('device_notifications', ()):
+        notify_device(device_id, reason)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_device_notifications(session):
+    session.info.pop('device_notifications', None)
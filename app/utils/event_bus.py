@@ -0,0 +1,127 @@
+"""
+In-process publish/subscribe bus
+
+Routes publish small JSON-able events to named topics ('attendance',
+'device:<device_id>', ...) and streaming / long-poll endpoints wait on them,
+so connected clients are woken by the write itself instead of each one
+re-querying the database on a timer.
+
+Each topic keeps a short history, and event IDs only ever grow (they start
+from the wall clock in milliseconds so they keep growing across restarts),
+so a client that reconnects with the last ID it saw gets what it missed.
+
+A waiting subscriber only holds a threading.Event - no database connection
+and no dedicated thread of its own. Under gevent (gunicorn -k gevent)
+threading is monkey-patched, so hundreds of idle subscribers are just
+parked greenlets. The bus is per process: run the streaming endpoints in a
+single gevent worker, or events published by one worker are not seen by
+clients connected to another. Outside gevent each waiter is a blocked
+thread, so streaming endpoints check cooperative() before parking clients.
+"""
+import threading
+import time as clock
+from collections import deque, namedtuple
+
+Event = namedtuple('Event', ['id', 'topic', 'data'])
+
+
+class Subscription:
+    """One client's view of a set of topics, resuming after ``last_id``"""
+
+    def __init__(self, bus, topics, last_id=None):
+        self.bus = bus
+        self.topics = frozenset(topics)
+        self.last_id = bus.last_id() if last_id is None else last_id
+        self._ready = threading.Event()
+
+    def wait(self, timeout):
+        """Events after last_id, blocking up to ``timeout`` seconds for the first one"""
+        self._ready.clear()
+        events = self.bus.events_since(self.topics, self.last_id)
+        if not events and self._ready.wait(timeout):
+            events = self.bus.events_since(self.topics, self.last_id)
+        if events:
+            self.last_id = events[-1].id
+        return events
+
+    def notify(self):
+        self._ready.set()
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBus:
+    """Topic -> recent events, plus the subscribers waiting on each topic"""
+
+    def __init__(self, history=256):
+        self._lock = threading.Lock()
+        self._history = {}  # topic -> deque of Event
+        self._subscribers = {}  # topic -> set of Subscription
+        self._next_id = int(clock.time() * 1000)
+        self.history = history
+
+    def publish(self, topic, data):
+        with self._lock:
+            self._next_id += 1
+            event = Event(self._next_id, topic, data)
+            self._history.setdefault(topic, deque(maxlen=self.history)).append(event)
+            waiting = list(self._subscribers.get(topic, ()))
+        for subscription in waiting:
+            subscription.notify()
+        return event
+
+    def subscribe(self, topics, last_id=None):
+        subscription = Subscription(self, topics, last_id)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                waiting = self._subscribers.get(topic)
+                if waiting is not None:
+                    waiting.discard(subscription)
+                    if not waiting:
+                        del self._subscribers[topic]
+
+    def events_since(self, topics, last_id):
+        with self._lock:
+            events = [e for topic in topics for e in self._history.get(topic, ()) if e.id > last_id]
+        return sorted(events, key=lambda e: e.id)
+
+    def last_id(self):
+        with self._lock:
+            return self._next_id
+
+    def stats(self):
+        with self._lock:
+            return {
+                'topics': len(self._history),
+                'subscribers': {topic: len(waiting) for topic, waiting in self._subscribers.items()}
+            }
+
+
+event_bus = EventBus()
+
+
+def cooperative():
+    """True when threading is gevent-patched, so a parked waiter is a greenlet, not an OS thread"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def publish(topic, data):
+    """Publish ``data`` to every subscriber of ``topic`` in this process"""
+    return event_bus.publish(topic, data)
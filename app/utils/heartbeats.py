@@ -0,0 +1,114 @@
+"""
+Write-behind device heartbeats
+
+Every mode check / command poll used to set Device.last_seen and commit, so
+each heartbeat from each device was its own write transaction. Heartbeats
+now go into an in-memory map; the newest time per device is written back in
+one batched UPDATE at most every HEARTBEAT_FLUSH_SECONDS, however many
+devices there are and however often they poll.
+
+Pages and endpoints that show online/offline state overlay the map onto the
+Device rows they load (apply()), so this process reports its own heartbeats
+immediately; heartbeats handled by another worker process show up once that
+worker flushes. The UPDATE never moves last_seen backwards, so workers
+flushing in any order agree on the newest value. Callers only record beats
+for devices they found in the devices table, so the map stays as small as
+the fleet whatever IDs clients send.
+"""
+import atexit
+import logging
+import threading
+import time as clock
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+
+class HeartbeatTracker:
+    """device_id -> last heartbeat, flushed to the devices table in batches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}  # Newest heartbeat handled by this process
+        self._dirty = {}  # Not yet written to the database
+        self._flushed_at = clock.monotonic()
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def beat(self, device_id, at=None, flush_interval=10):
+        """Record a heartbeat of a registered device; flushes the batch if ``flush_interval`` seconds have passed"""
+        from app.utils.timezone import get_naive_now
+
+        at = at or get_naive_now()
+        with self._lock:
+            self._seen[device_id] = at
+            self._dirty[device_id] = at
+            due = clock.monotonic() - self._flushed_at >= flush_interval
+        if due:
+            self.flush()
+
+    def last_seen(self, device_id):
+        with self._lock:
+            return self._seen.get(device_id)
+
+    def apply(self, devices):
+        """Overlay newer in-memory heartbeats onto loaded Device rows (without dirtying them)"""
+        with self._lock:
+            seen = dict(self._seen)
+        for device in devices:
+            at = seen.get(device.device_id)
+            if at is not None and (device.last_seen is None or at > device.last_seen):
+                set_committed_value(device, 'last_seen', at)
+        return devices
+
+    def flush(self):
+        """Write pending heartbeats in one executemany UPDATE; returns the number of devices"""
+        from app import db
+        from app.models import Device
+
+        with self._lock:
+            batch, self._dirty = self._dirty, {}
+            self._flushed_at = clock.monotonic()
+        if not batch:
+            return 0
+
+        table = Device.__table__
+        statement = update(table).where(
+            table.c.device_id == bindparam('b_device_id'),
+            or_(table.c.last_seen.is_(None), table.c.last_seen < bindparam('b_last_seen'))
+        ).values(last_seen=bindparam('b_last_seen'))
+        try:
+            # Own connection/transaction: independent of whatever the request session is doing
+            with db.engine.begin() as conn:
+                conn.execute(statement, [{'b_device_id': d, 'b_last_seen': at} for d, at in batch.items()])
+        except Exception as e:
+            logging.warning(f"Heartbeat flush failed, will retry: {e}")
+            with self._lock:
+                for device_id, at in batch.items():
+                    if device_id not in self._dirty or self._dirty[device_id] < at:
+                        self._dirty[device_id] = at
+            return 0
+
+        with self._lock:
+            self.flushes += 1
+            self.rows_flushed += len(batch)
+        return len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracked_devices': len(self._seen),
+                'pending': len(self._dirty),
+                'flushes': self.flushes,
+                'rows_flushed': self.rows_flushed
+            }
+
+
+heartbeats = HeartbeatTracker()
+
+
+def register_heartbeat_flush(app):
+    """Write pending heartbeats when the process exits"""
+    def flush_on_exit():
+        with app.app_context():
+            heartbeats.flush()
+    atexit.register(flush_on_exit)
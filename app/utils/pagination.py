@@ -0,0 +1,98 @@
+"""
+Keyset (cursor) pagination and streamed JSON lists
+
+List endpoints page with "rows after this one" instead of OFFSET: the
+client passes back the opaque ``next_cursor`` from the previous page, which
+encodes the sort key of the last row it received. Each page is then an
+index range scan from that key, so page 1,000 costs the same as page 1, and
+rows inserted while paging don't shift later pages.
+
+For exports, ``stream=true`` walks the same keyset in batches and writes the
+JSON array as it goes; each batch is serialized and dropped from the session
+before the next is loaded, so memory stays bounded by the batch size rather
+than by the table size.
+"""
+import base64
+import json
+from datetime import datetime
+from flask import Response, stream_with_context
+from sqlalchemy import DateTime, and_, or_
+
+
+class Keyset:
+    """A unique sort order over ``columns``: DateTime / integer columns ending in the primary key"""
+
+    def __init__(self, *columns, descending=False):
+        self.columns = columns
+        self.descending = descending
+
+    def order_by(self):
+        return [column.desc() if self.descending else column.asc() for column in self.columns]
+
+    def after(self, values):
+        """Filter for rows that sort strictly after the row with key ``values``"""
+        clauses = []
+        for i, (column, value) in enumerate(zip(self.columns, values)):
+            beyond = column < value if self.descending else column > value
+            clauses.append(and_(*[c == v for c, v in zip(self.columns[:i], values[:i])], beyond))
+        return or_(*clauses)
+
+    def encode(self, row):
+        values = [getattr(row, column.key) for column in self.columns]
+        raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        """Key values from a cursor; raises ValueError if it is malformed"""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if not isinstance(values, list) or len(values) != len(self.columns):
+                raise ValueError
+            return [
+                datetime.fromisoformat(v) if isinstance(column.type, DateTime) else int(v)
+                for column, v in zip(self.columns, values)
+            ]
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor')
+
+    def page(self, query, cursor=None, limit=100):
+        """(rows, next_cursor) - next_cursor is None on the last page"""
+        if cursor:
+            query = query.filter(self.after(self.decode(cursor)))
+        # One extra row tells us whether there is a next page without a COUNT
+        rows = query.order_by(*self.order_by()).limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, self.encode(rows[-1])
+        return rows, None
+
+    def iter_rows(self, query, cursor=None, batch_size=500):
+        """Every row after ``cursor``, loaded ``batch_size`` at a time"""
+        while True:
+            rows, cursor = self.page(query, cursor, batch_size)
+            yield from rows
+            for row in rows:
+                query.session.expunge(row)
+            if cursor is None:
+                return
+
+
+def stream_json(key, rows, serialize):
+    """Response body ``{"<key>": [...], "count": n}`` written row by row"""
+    def generate():
+        count = 0
+        yield '{"%s": [' % key
+        for row in rows:
+            yield (',' if count else '') + json.dumps(serialize(row))
+            count += 1
+        yield '], "count": %d}' % count
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def page_args(args, default_limit, max_limit):
+    """(cursor, limit, stream) from the query string"""
+    limit = args.get('limit', type=int, default=default_limit)
+    limit = min(max(limit, 1), max_limit)
+    stream = args.get('stream', 'false').lower() == 'true'
+    return args.get('cursor') or None, limit, stream
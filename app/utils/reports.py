@@ -0,0 +1,208 @@
+"""
+Attendance reports computed in SQL
+
+The class report used to load every attendance row of every student (one
+query per student) and count and average them in Python. It is now a
+single grouped aggregate, outer-joined to the enrolled students, so it is
+one query regardless of class size and only one row per student comes back.
+The web page (/reports/class/<id>) and the JSON API
+(/api/classes/<id>/attendance-report) both use it.
+
+The class report and the reports page read daily_attendance_summary (one
+row per day, class and student; see app/utils/daily_summary.py) rather than
+raw attendance, so their cost follows the number of days covered, not the
+number of scans.
+
+status_counts() is the one place present / late / absent totals come from:
+a single GROUP BY status over whatever filtered attendance query the caller
+built, optionally split per day and per class in the same pass (stats API,
+reports page, attendance list).
+
+absence_matrix() joins the class's session calendar (class_sessions; see
+app/utils/class_sessions.py) to its students and the summary, so who missed
+which session is one query instead of a Python walk over the date range.
+"""
+from app import db
+from app.models import Attendance, ClassSession, DailyAttendanceSummary, Student
+from app.utils.class_sessions import ended_by
+from app.utils.timezone import get_naive_now
+
+STATUSES = ('present', 'late', 'absent')
+UNASSIGNED = 'unassigned'  # by_class key for rows recorded outside any class
+
+
+def _empty_counts():
+    return dict.fromkeys(('total',) + STATUSES, 0)
+
+
+def status_counts(query, by_day=False, by_class=False):
+    """Status counts of a filtered Attendance query in one grouped statement
+
+    Returns {'total', 'present', 'late', 'absent'}; with ``by_day`` also
+    'by_day': {'YYYY-MM-DD': counts} and with ``by_class`` also
+    'by_class': {'<class_id>' or 'unassigned': counts}, rolled up from the
+    same result rows. Class keys are strings so rows without a class can sit
+    next to them (jsonify sorts keys and can't compare None with int).
+    """
+    keys = []
+    if by_day:
+        keys.append(db.func.date(Attendance.timestamp).label('day'))
+    if by_class:
+        keys.append(Attendance.class_id)
+
+    rows = query.order_by(None).with_entities(
+        *keys, Attendance.status, db.func.count(Attendance.id)
+    ).group_by(*keys, Attendance.status).all()
+
+    counts = _empty_counts()
+    days, classes = {}, {}
+    for row in rows:
+        *key, status, count = row
+        buckets = [counts]
+        if by_day:
+            # SQLite returns date() as text, PostgreSQL as a date
+            buckets.append(days.setdefault(str(key.pop(0)), _empty_counts()))
+        if by_class:
+            buckets.append(classes.setdefault(key.pop(0), _empty_counts()))
+        for bucket in buckets:
+            bucket['total'] += count
+            if status in bucket:
+                bucket[status] += count
+
+    if by_day:
+        counts['by_day'] = dict(sorted(days.items()))
+    if by_class:
+        counts['by_class'] = {
+            UNASSIGNED if class_id is None else str(class_id): bucket
+            for class_id, bucket in sorted(classes.items(), key=lambda item: (item[0] is None, item[0] or 0))
+        }
+    return counts
+
+
+def build_class_report(class_obj, max_marks=10):
+    """Per-student attendance, percentage and marks for ``class_obj``
+
+    Returns {'attendance_data': [...], 'students': [...], 'class_average',
+    'avg_duration'}; each attendance_data entry has 'student',
+    'classes_attended' (records with an exit), 'avg_duration' (over records
+    with a non-zero duration), 'attendance_percentage' (of total_classes)
+    and 'marks' (out of ``max_marks``).
+    """
+    summary = DailyAttendanceSummary
+    totals = db.session.query(
+        summary.student_id,
+        db.func.sum(summary.completed_count).label('classes_attended'),
+        db.func.sum(summary.duration_minutes).label('duration_sum'),
+        db.func.sum(summary.timed_count).label('duration_count')
+    ).filter(
+        summary.class_id == class_obj.id
+    ).group_by(summary.student_id).subquery()
+
+    rows = db.session.query(
+        Student, totals.c.classes_attended, totals.c.duration_sum, totals.c.duration_count
+    ).outerjoin(
+        totals, totals.c.student_id == Student.id
+    ).filter(
+        Student.class_id == class_obj.id
+    ).options(db.defer(Student.fingerprint_template)).order_by(Student.name).all()
+
+    total_classes = class_obj.total_classes or 1  # Avoid division by zero
+    attendance_data = []
+    total_attendance_sum = 0
+    total_duration_sum = 0
+    total_duration_count = 0
+
+    for student, classes_attended, duration_sum, duration_count in rows:
+        classes_attended = classes_attended or 0
+        duration_sum = duration_sum or 0
+        duration_count = duration_count or 0
+        total_duration_sum += duration_sum
+        total_duration_count += duration_count
+
+        attendance_percentage = (classes_attended / total_classes) * 100
+        total_attendance_sum += attendance_percentage
+
+        attendance_data.append({
+            'student': student,
+            'classes_attended': classes_attended,
+            'avg_duration': duration_sum / duration_count if duration_count else 0,
+            'attendance_percentage': attendance_percentage,
+            'marks': (attendance_percentage / 100) * max_marks
+        })
+
+    return {
+        'attendance_data': attendance_data,
+        'students': [data['student'] for data in attendance_data],
+        'class_average': total_attendance_sum / len(rows) if rows else 0,
+        'avg_duration': total_duration_sum / total_duration_count if total_duration_count else 0
+    }
+
+
+def summary_status_counts(start, end, class_id=None):
+    """status_counts()-style totals for days in [start, end) from the daily summary"""
+    summary = DailyAttendanceSummary
+    query = db.session.query(
+        db.func.sum(summary.total_count),
+        db.func.sum(summary.present_count),
+        db.func.sum(summary.late_count),
+        db.func.sum(summary.absent_count)
+    ).filter(summary.day >= start, summary.day < end)
+    if class_id:
+        query = query.filter(summary.class_id == class_id)
+
+    total, present, late, absent = query.one()
+    return {'total': total or 0, 'present': present or 0, 'late': late or 0, 'absent': absent or 0}
+
+
+def summary_top_students(start, end, class_id=None, limit=10):
+    """(id, name, total_attendance) for the students who attended most in [start, end)
+
+    Counts present and late records only, so 'absent' rows written by the
+    session-end job don't rank a student as a top attendee.
+    """
+    summary = DailyAttendanceSummary
+    total = db.func.sum(summary.present_count + summary.late_count)
+    query = db.session.query(
+        Student.id, Student.name, total.label('total_attendance')
+    ).join(
+        summary, summary.student_id == Student.id
+    ).filter(summary.day >= start, summary.day < end)
+    if class_id:
+        query = query.filter(summary.class_id == class_id)
+
+    return query.group_by(Student.id, Student.name).having(total > 0).order_by(total.desc()).limit(limit).all()
+
+
+def absence_matrix(class_obj, now=None):
+    """Attendance of every enrolled student at every session of ``class_obj`` held so far
+
+    Returns {'sessions': [ClassSession], 'students': [{'student', 'attended':
+    [bool per session], 'absences'}]}. A session counts as held once its end
+    time has passed, and as attended if the student has a present or late
+    record in the class that day.
+    """
+    held = ended_by(now or get_naive_now())
+    sessions = ClassSession.query.filter(ClassSession.class_id == class_obj.id, held).order_by(
+        ClassSession.session_date
+    ).all()
+    students = Student.query.filter_by(class_id=class_obj.id).options(
+        db.defer(Student.fingerprint_template)
+    ).order_by(Student.name).all()
+
+    summary = DailyAttendanceSummary
+    attended = set(db.session.query(summary.student_id, ClassSession.session_date).join(
+        ClassSession, db.and_(
+            ClassSession.class_id == summary.class_id,
+            ClassSession.session_date == summary.day
+        )
+    ).filter(
+        summary.class_id == class_obj.id, held
+    ).group_by(summary.student_id, ClassSession.session_date).having(
+        db.func.sum(summary.present_count + summary.late_count) > 0
+    ).all())
+
+    rows = []
+    for student in students:
+        marks = [(student.id, session.session_date) in attended for session in sessions]
+        rows.append({'student': student, 'attended': marks, 'absences': marks.count(False)})
+    return {'sessions': sessions, 'students': rows}
@@ -0,0 +1,183 @@
+"""
+Batches of buffered device scans
+
+A device that loses its connection keeps its scans (fingerprint ID, time)
+and uploads them together once it is back (POST /api/attendance/batch).
+Each scan is checked against the class schedule at its own time and goes
+through the same cooldown / entry / exit / already-recorded rules as a live
+scan, in timestamp order, so an entry and exit buffered in the same batch
+pair up.
+
+The whole batch is one transaction and a fixed number of statements: one
+student lookup, one query loading every (student, class, day) state
+(attendance_state.load_many), an executemany UPDATE for exits of entries
+already stored, one for entries replacing an 'absent' row the session-end
+job wrote in the meantime, one bulk insert for new entries, and the summary
+deltas in one batch. An entry whose class had already ended when the batch
+arrived, with no exit scan in it, is closed at the class's end time just as
+the session-end job would have.
+
+Re-sending a batch whose response was lost records nothing twice: the
+repeated scans fall in the cooldown or are already recorded.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam
+
+from app.utils.absences import missing_exit_note
+from app.utils.attendance_state import attendance_state, entry_status
+from app.utils.bulk import bulk_insert
+from app.utils.daily_summary import add_contribution, write_deltas
+from app.utils.timezone import DHAKA_TZ
+
+FUTURE_SKEW = timedelta(seconds=60)  # Device clocks may run slightly ahead
+MAX_SCAN_AGE = timedelta(days=7)  # Older scans are rejected per item rather than recorded
+# Columns an entry writes over the 'absent' row it replaces
+CONVERTED = ('device_id', 'status', 'confidence', 'timestamp', 'entry_time', 'exit_time', 'duration_minutes', 'notes')
+
+
+def scan_time(scan, received_at):
+    """Naive Asia/Dhaka time of one scan: 'timestamp' (ISO 8601) or 'age_seconds' before ``received_at``"""
+    if scan.get('timestamp') is not None:
+        at = datetime.fromisoformat(str(scan['timestamp']))
+        if at.tzinfo is not None:
+            at = at.astimezone(DHAKA_TZ).replace(tzinfo=None)
+    elif scan.get('age_seconds') is not None:
+        age = float(scan['age_seconds'])
+        # Also rejects inf and NaN, which json.loads accepts
+        if not 0 <= age <= MAX_SCAN_AGE.total_seconds():
+            raise ValueError(f'age_seconds must be between 0 and {int(MAX_SCAN_AGE.total_seconds())}')
+        at = received_at - timedelta(seconds=age)
+    else:
+        raise ValueError('timestamp or age_seconds is required')
+    if at > received_at + FUTURE_SKEW:
+        raise ValueError('Scan time is in the future')
+    if at < received_at - MAX_SCAN_AGE:
+        raise ValueError(f'Scan is older than {MAX_SCAN_AGE.days} days')
+    return at
+
+
+def record_scan_batch(session, scans, device_id, received_at, resolve_class):
+    """Apply buffered ``scans`` (dicts) from ``device_id`` inside ``session``'s transaction
+
+    ``resolve_class(at)`` returns the class info running for the device at
+    ``at`` (or None). Returns (results, keys): one result dict per scan in
+    request order, and the (student_id, class_id, day) state keys touched,
+    which the caller forget()s from attendance_state after committing.
+    """
+    from app import db
+    from app.models import Attendance, Student
+
+    results = [None] * len(scans)
+    parsed = []
+    for index, scan in enumerate(scans):
+        try:
+            if not isinstance(scan, dict) or scan.get('fingerprint_id') is None:
+                raise ValueError('fingerprint_id is required')
+            parsed.append((scan_time(scan, received_at), index, int(scan['fingerprint_id']), scan.get('confidence')))
+        except (TypeError, ValueError, ArithmeticError) as e:  # OverflowError from extreme dates
+            results[index] = {'index': index, 'status': 'error', 'message': str(e)}
+
+    students = {}
+    if parsed:
+        students = {student.fingerprint_id: student for student in Student.query.options(
+            db.defer(Student.fingerprint_template)
+        ).filter(Student.fingerprint_id.in_({item[2] for item in parsed}))}
+
+    # Oldest first, so each scan sees the ones before it
+    work = []
+    for at, index, fingerprint_id, confidence in sorted(parsed):
+        student = students.get(fingerprint_id)
+        if student is None:
+            results[index] = {'index': index, 'status': 'error', 'message': 'Student not found',
+                              'fingerprint_id': fingerprint_id}
+            continue
+        current_class = resolve_class(at)
+        if current_class is None:
+            results[index] = {'index': index, 'status': 'error', 'message': 'No class running',
+                              'student_name': student.name, 'timestamp': at.isoformat()}
+            continue
+        work.append((at, index, student, confidence, current_class))
+
+    states = attendance_state.load_many((student.id, info['id'], at.date()) for at, _, student, _, info in work)
+    pending, class_ends = {}, {}  # key -> entry row created by this batch / its class's end
+    inserts, conversions, exits, deltas = [], [], [], {}
+
+    for at, index, student, confidence, current_class in work:
+        key = (student.id, current_class['id'], at.date())
+        state = states[key]
+        decision = state.decide(at)
+        result = {'index': index, 'student_name': student.name, 'class_name': current_class['name'],
+                  'timestamp': at.isoformat()}
+
+        if decision == 'cooldown':
+            result.update(status='cooldown', message='Scan within the cooldown of the previous one')
+        elif decision == 'completed':
+            result.update(status='error', message='Already recorded')
+        elif decision == 'exit':
+            entry = state.open_entry
+            duration = int((at - entry['entry_time']).total_seconds() / 60) if entry['entry_time'] else None
+            exit_values = {'exit_time': at, 'duration_minutes': duration, 'notes': f"Exited at {at.strftime('%H:%M:%S')}"}
+            if key in pending:
+                pending[key].update(exit_values)
+            else:
+                exits.append({'b_id': entry['id'], **{f'b_{name}': value for name, value in exit_values.items()}})
+                before = {'timestamp': entry['timestamp'], 'class_id': key[1], 'student_id': student.id,
+                          'status': entry['status'], 'exit_time': None, 'duration_minutes': None}
+                add_contribution(deltas, before, -1)
+                add_contribution(deltas, dict(before, exit_time=at, duration_minutes=duration))
+            state.record_exit(at, duration)
+            result.update(status='exit', attendance_status=entry['status'], duration_minutes=duration)
+        else:
+            class_start = datetime.strptime(current_class['start_time'], '%H:%M').time()
+            class_end = datetime.strptime(current_class['end_time'], '%H:%M').time()
+            status, late_by_minutes = entry_status(class_start, at)
+            row = {
+                'student_id': student.id,
+                'class_id': current_class['id'],
+                'device_id': device_id,
+                'status': status,
+                'confidence': confidence,
+                'timestamp': at,
+                'entry_time': at,
+                'exit_time': None,
+                'duration_minutes': None,
+                'notes': f"Entered at {at.strftime('%H:%M:%S')}" + (f" (Late by {late_by_minutes} min)" if status == 'late' else "")
+            }
+            if state.marked_absent is not None:
+                row['id'] = state.marked_absent['id']
+                add_contribution(deltas, {'timestamp': state.marked_absent['timestamp'], 'class_id': key[1],
+                                          'student_id': student.id, 'status': 'absent'}, -1)
+                state.marked_absent = None
+                conversions.append(row)
+            else:
+                inserts.append(row)
+            pending[key] = row
+            class_ends[key] = datetime.combine(at.date(), class_end)
+            state.record_entry(None, at, status)
+            result.update(status='entry', attendance_status=status, late_by_minutes=late_by_minutes)
+        results[index] = result
+
+    for key, row in pending.items():
+        ends_at = class_ends[key]
+        if row['exit_time'] is None and ends_at <= received_at:
+            row.update(exit_time=ends_at, duration_minutes=max(int((ends_at - row['entry_time']).total_seconds() / 60), 0),
+                       notes=missing_exit_note(ends_at))
+
+    conn = session.connection()
+    attendance = Attendance.__table__
+    if conversions:
+        conn.execute(attendance.update().where(attendance.c.id == bindparam('b_id')).values(
+            {name: bindparam(f'b_{name}') for name in CONVERTED}
+        ), [{'b_id': row['id'], **{f'b_{name}': row[name] for name in CONVERTED}} for row in conversions])
+        for row in conversions:
+            add_contribution(deltas, row)
+    if exits:
+        conn.execute(attendance.update().where(attendance.c.id == bindparam('b_id')).values(
+            exit_time=bindparam('b_exit_time'),
+            duration_minutes=bindparam('b_duration_minutes'),
+            notes=bindparam('b_notes')
+        ), exits)
+    if deltas:
+        write_deltas(conn, deltas)
+    bulk_insert(Attendance, inserts, session)
+    return results, set(states)
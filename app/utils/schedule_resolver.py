@@ -0,0 +1,174 @@
+"""
+Cached current-running-class resolver
+
+Every active class schedule is loaded once into per-weekday interval trees,
+one per room plus one over all rooms, so "which class is running for this
+device right now" is an O(log n) stabbing query instead of a ClassSchedule
+query plus one Class lookup per schedule. Several classes can run at once in
+different rooms; a device only ever sees the classes scheduled in its own
+location (Device.location == ClassSchedule.room).
+
+The cache is dropped by the class and schedule write routes through
+invalidate_schedule_cache(). SCHEDULE_CACHE_TTL bounds how stale another
+worker process's copy can get, since invalidation only reaches this process.
+"""
+import threading
+import time as clock
+from datetime import datetime
+
+
+def room_key(room):
+    """Normalise a room / device location for matching"""
+    return room.strip().lower() if room and room.strip() else None
+
+
+class IntervalTree:
+    """Static centered interval tree over (start, end, order, payload) tuples"""
+
+    def __init__(self, intervals):
+        self.center = None
+        self.left = self.right = None
+        if not intervals:
+            return
+
+        points = sorted([i[0] for i in intervals] + [i[1] for i in intervals])
+        self.center = points[len(points) // 2]
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval[1] < self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+
+        self.by_start = sorted(here, key=lambda i: i[0])
+        self.by_end = sorted(here, key=lambda i: i[1], reverse=True)
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    def query(self, point):
+        """All intervals with start <= point <= end"""
+        found = []
+        node = self
+        while node is not None and node.center is not None:
+            if point < node.center:
+                for interval in node.by_start:
+                    if interval[0] > point:
+                        break
+                    found.append(interval)
+                node = node.left
+            elif point > node.center:
+                for interval in node.by_end:
+                    if interval[1] < point:
+                        break
+                    found.append(interval)
+                node = node.right
+            else:
+                found.extend(node.by_start)
+                break
+        return found
+
+
+class ScheduleResolver:
+    """Per-weekday interval trees keyed by room, plus a per-class lookup"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._days = None
+        self._loaded_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._days = None
+
+    def _load(self, ttl):
+        with self._lock:
+            if self._days is not None and clock.monotonic() - self._loaded_at < ttl:
+                return self._days
+
+            from app import db
+            from app.models import Class, ClassSchedule
+
+            rows = db.session.query(ClassSchedule, Class).join(
+                Class, ClassSchedule.class_id == Class.id
+            ).filter(Class.is_active.is_(True)).order_by(
+                ClassSchedule.start_time, ClassSchedule.id
+            ).all()
+
+            grouped = {}
+            for order, (schedule, class_obj) in enumerate(rows):
+                interval = (schedule.start_time, schedule.end_time, order, {
+                    'id': class_obj.id,
+                    'name': class_obj.name,
+                    'code': class_obj.code,
+                    'teacher_name': class_obj.teacher_name,
+                    'room': schedule.room,
+                    'start_time': schedule.start_time.strftime('%H:%M'),
+                    'end_time': schedule.end_time.strftime('%H:%M')
+                })
+                day = grouped.setdefault(schedule.day_of_week, {'rooms': {}, 'classes': {}, 'all': []})
+                day['rooms'].setdefault(room_key(schedule.room), []).append(interval)
+                day['classes'][class_obj.id] = interval
+                day['all'].append(interval)
+
+            self._days = {
+                day: {
+                    'all': IntervalTree(groups['all']),
+                    'rooms': {room: IntervalTree(intervals) for room, intervals in groups['rooms'].items()},
+                    'classes': groups['classes']
+                }
+                for day, groups in grouped.items()
+            }
+            self._loaded_at = clock.monotonic()
+            return self._days
+
+    def running(self, now, ttl=60, room=None, class_id=None):
+        """Class info dict for the class running at ``now``, or None
+
+        With neither ``room`` nor ``class_id`` this considers every schedule.
+        For a device, ``class_id`` is the class it is pinned to (used if that
+        class is running) and ``room`` its location: classes scheduled there
+        win, then classes with no room set. Classes in other rooms are never
+        returned. Ties go to the earliest start.
+        """
+        day = self._load(ttl).get(now.strftime('%A').lower())
+        if not day:
+            return None
+
+        current_time = now.time()
+        found = None
+
+        if class_id is not None:
+            pinned = day['classes'].get(class_id)
+            if pinned and pinned[0] <= current_time <= pinned[1]:
+                found = pinned
+
+        if found is None:
+            if room is None and class_id is None:
+                trees = [day['all']]
+            else:
+                trees = [day['rooms'].get(room_key(room))] if room_key(room) else []
+                trees.append(day['rooms'].get(None))
+            for tree in trees:
+                hits = tree.query(current_time) if tree else []
+                if hits:
+                    found = min(hits, key=lambda i: (i[0], i[2]))
+                    break
+
+        if found is None:
+            return None
+
+        end_datetime = datetime.combine(datetime.today(), found[1])
+        current_datetime = datetime.combine(datetime.today(), current_time)
+        info = dict(found[3])
+        info['time_remaining_minutes'] = int((end_datetime - current_datetime).total_seconds() / 60)
+        return info
+
+
+schedule_resolver = ScheduleResolver()
+
+
+def invalidate_schedule_cache():
+    """Call after any write to classes or class_schedules"""
+    schedule_resolver.invalidate()
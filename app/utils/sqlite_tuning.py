@@ -0,0 +1,41 @@
+"""
+SQLite connection tuning
+
+SQLite's defaults (rollback journal, synchronous=FULL, no busy timeout) make
+every writer block every reader and fail immediately with "database is
+locked" when two requests write at once. SQLITE_PRAGMAS in the config is
+applied to each new pooled connection:
+
+    journal_mode=WAL      readers no longer block on the writer (and vice versa)
+    synchronous=NORMAL    fsync at checkpoints instead of every commit; safe under WAL
+    busy_timeout          wait this many ms for the write lock instead of erroring
+    mmap_size             read pages through a memory map instead of read() calls
+    cache_size            page cache per connection (negative = KiB)
+
+Non-SQLite engines are left untouched.
+"""
+from sqlalchemy import event
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run ``PRAGMA key=value`` for every new DBAPI connection of a SQLite engine"""
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return False
+
+    statements = [f'PRAGMA {key}={value}' for key, value in pragmas.items()]
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    return True
+
+
+def current_pragmas(connection, names=('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')):
+    """Effective pragma values on a connection, for diagnostics"""
+    return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in names}
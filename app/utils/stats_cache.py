@@ -0,0 +1,102 @@
+"""
+Cached dashboard / sidebar counts
+
+Every page render used to run four COUNT queries (students, active classes,
+devices, today's attendance) in the sidebar context processor, and the
+dashboard ran the same four again. The counts are now computed in a single
+statement and cached per process.
+
+A commit that inserted or deleted rows in any of those tables (or updated a
+class) drops the cache (session events below; app/utils/bulk.py reports its
+inserts the same way), so this process always sees its own writes. STATS_CACHE_TTL bounds how
+long writes made by another worker process can go unseen. The cache is also
+dropped at midnight, when "today" changes.
+"""
+import threading
+import time as clock
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+# Tables whose writes change the counts
+TRACKED_TABLES = {'students', 'classes', 'devices', 'attendance'}
+
+
+class StatsCache:
+    """One cached row of counts, recomputed after TTL, a relevant commit or midnight"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = None
+        self._day = None
+        self._loaded_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._stats = None
+
+    def get(self, ttl=30):
+        from app.utils.timezone import get_today_start
+
+        today_start = get_today_start()
+        with self._lock:
+            if (self._stats is not None and self._day == today_start
+                    and clock.monotonic() - self._loaded_at < ttl):
+                return dict(self._stats)
+
+        stats = self._load(today_start)
+        with self._lock:
+            self._stats, self._day, self._loaded_at = stats, today_start, clock.monotonic()
+        return dict(stats)
+
+    def _load(self, today_start):
+        from app import db
+        from app.models import Student, Class, Device, Attendance
+
+        row = db.session.execute(select(
+            select(func.count(Student.id)).scalar_subquery().label('total_students'),
+            select(func.count(Class.id)).where(Class.is_active.is_(True)).scalar_subquery().label('total_classes'),
+            select(func.count(Device.id)).scalar_subquery().label('total_devices'),
+            select(func.count(Attendance.id)).where(
+                Attendance.timestamp >= today_start
+            ).scalar_subquery().label('today_attendance')
+        )).one()
+        return dict(row._mapping)
+
+
+stats_cache = StatsCache()
+
+
+def get_stats(ttl=30):
+    """{'total_students', 'total_classes', 'total_devices', 'today_attendance'}"""
+    return stats_cache.get(ttl)
+
+
+def invalidate_stats_cache():
+    stats_cache.invalidate()
+
+
+def mark_tables_changed(session, *table_names):
+    """Record writes the ORM doesn't see (Core/bulk statements) for the commit hook"""
+    session.info.setdefault('changed_tables', set()).update(table_names)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_tables(session, flush_context):
+    # Counts only move on inserts and deletes - plus classes, where is_active can flip.
+    # Ignoring other updates keeps device heartbeats and exit scans from dropping the cache.
+    changed = {obj.__table__.name for obj in (*session.new, *session.deleted) if hasattr(obj, '__table__')}
+    changed.update(obj.__table__.name for obj in session.dirty if obj.__table__.name == 'classes')
+    if changed:
+        mark_tables_changed(session, *changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    changed = session.info.pop('changed_tables', None)
+    if changed and changed & TRACKED_TABLES:
+        stats_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_tables(session):
+    session.info.pop('changed_tables', None)
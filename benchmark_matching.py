@@ -0,0 +1,123 @@
+"""
+Fingerprint matcher benchmark
+
+Builds synthetic galleries of random 512-byte templates and measures 1:N
+identify throughput and latency for a matcher backend. Probes are noisy
+copies of enrolled templates, so every query is expected to find its owner.
+
+Usage:
+    python benchmark_matching.py
+    python benchmark_matching.py --backend byte_equality --sizes 1000,10000 --queries 500
+    python benchmark_matching.py --workers 4 --parallel-min 10000
+    python benchmark_matching.py --prefilter-bands 32 --prefilter-width 2
+"""
+import argparse
+import time
+import numpy as np
+from app.matching import MATCHERS, TEMPLATE_SIZE, create_matcher
+
+
+def build_gallery(size, rng):
+    """Random templates keyed by student IDs 1..size"""
+    templates = rng.integers(0, 256, size=(size, TEMPLATE_SIZE), dtype=np.uint8)
+    return [(i + 1, templates[i].tobytes()) for i in range(size)], templates
+
+
+def make_probe(template, noise, rng):
+    """Copy of a template with a fraction of its bytes randomized"""
+    probe = template.copy()
+    positions = rng.random(TEMPLATE_SIZE) < noise
+    probe[positions] = rng.integers(0, 256, size=int(positions.sum()), dtype=np.uint8)
+    return probe.tobytes()
+
+
+def run(backend, size, queries, noise, seed, options):
+    rng = np.random.default_rng(seed)
+    rows, templates = build_gallery(size, rng)
+
+    matcher = create_matcher(backend, **options)
+    started = time.perf_counter()
+    matcher.load(rows)
+    load_seconds = time.perf_counter() - started
+
+    owners = rng.integers(0, size, size=queries)
+    probes = [make_probe(templates[i], noise, rng) for i in owners]
+
+    latencies = np.empty(queries)
+    correct = 0
+    for q, (owner, probe) in enumerate(zip(owners, probes)):
+        started = time.perf_counter()
+        student_id, score = matcher.identify(probe)
+        latencies[q] = time.perf_counter() - started
+        if student_id == owner + 1 and matcher.is_match(score):
+            correct += 1
+
+    stats = matcher.stats()
+    matcher.close()
+
+    total = latencies.sum()
+    return {
+        'prefilter': stats.get('prefilter'),
+        'size': size,
+        'load_ms': load_seconds * 1000,
+        'identify_per_sec': queries / total,
+        'matches_per_sec': queries * size / total,
+        'p50_ms': np.percentile(latencies, 50) * 1000,
+        'p99_ms': np.percentile(latencies, 99) * 1000,
+        'accuracy': correct / queries * 100
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fingerprint matcher backends')
+    parser.add_argument('--backend', default='byte_equality', choices=sorted(MATCHERS))
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='Comma-separated gallery sizes')
+    parser.add_argument('--queries', type=int, default=200, help='Identify calls per gallery size')
+    parser.add_argument('--noise', type=float, default=0.3,
+                        help='Fraction of probe bytes randomized (0-1)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Process pool size for parallel scans (0 = in-process)')
+    parser.add_argument('--parallel-min', type=int, default=20000,
+                        help='Gallery size at which scans fan out to the pool')
+    parser.add_argument('--prefilter-bands', type=int, default=0,
+                        help='Candidate pre-filter bands (0 = score every template)')
+    parser.add_argument('--prefilter-width', type=int, default=2,
+                        help='Byte positions per pre-filter band')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    options = {}
+    if args.workers:
+        options.update(workers=args.workers, parallel_min_gallery=args.parallel_min)
+    if args.prefilter_bands:
+        options.update(prefilter_bands=args.prefilter_bands, prefilter_band_width=args.prefilter_width)
+
+    print("=" * 78)
+    print(f"MATCHER BENCHMARK - backend: {args.backend}, queries: {args.queries}, "
+          f"noise: {args.noise}, workers: {args.workers or 'in-process'}")
+    if args.prefilter_bands:
+        from app.matching.prefilter import BandedPrefilter
+        prefilter = BandedPrefilter(args.prefilter_bands, args.prefilter_width)
+        recall = ', '.join(f"{score}%: {prefilter.expected_recall(score) * 100:.2f}%"
+                           for score in (40, 50, 70))
+        print(f"Pre-filter {args.prefilter_bands} bands x {args.prefilter_width} bytes, "
+              f"expected recall at score {recall}")
+    print("=" * 78)
+    print(f"{'gallery':>9} {'load ms':>9} {'identify/s':>11} {'matches/s':>13} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'accuracy':>9}")
+    for size in sizes:
+        r = run(args.backend, size, args.queries, args.noise, args.seed, options)
+        print(f"{r['size']:>9} {r['load_ms']:>9.1f} {r['identify_per_sec']:>11.1f} "
+              f"{r['matches_per_sec']:>13.0f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} "
+              f"{r['accuracy']:>8.1f}%")
+        if r['prefilter']:
+            p = r['prefilter']
+            print(f"{'':>9} candidates mean {p['candidates_mean']:.1f}, p50 {p['candidates_p50']:.0f}, "
+                  f"p99 {p['candidates_p99']:.0f}, max {p['candidates_max']} "
+                  f"({p['candidates_mean'] / r['size'] * 100:.2f}% of gallery)")
+
+
+if __name__ == '__main__':
+    main()
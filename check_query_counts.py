@@ -0,0 +1,144 @@
+"""
+Query-count (N+1) regression check
+
+Seeds two in-memory SQLite databases, one several times larger than the
+other, requests every list endpoint and page against each and counts the
+SQL statements it issues. A lazy-loaded relationship touched per row
+(``att.student.name`` in a template, ``len(self.students)`` in a to_dict)
+makes the count grow with the data, so any endpoint whose count differs
+between the two sizes fails the check.
+
+Usage:
+    python check_query_counts.py
+    python check_query_counts.py --scale 10 --verbose
+
+Exits with status 1 if any endpoint's query count depends on row count.
+"""
+import argparse
+import sys
+from datetime import timedelta
+from sqlalchemy import event
+from config import TestingConfig
+
+TestingConfig.SQLALCHEMY_DATABASE_URI = 'sqlite://'
+TestingConfig.MATCHER_SNAPSHOT_PATH = ''
+
+from app import create_app, db  # noqa: E402
+from app.models import Attendance, Class, ClassSchedule, Device, Student  # noqa: E402
+from app.utils.bulk import bulk_insert  # noqa: E402
+from app.utils.schedule_resolver import invalidate_schedule_cache  # noqa: E402
+from app.utils.stats_cache import invalidate_stats_cache  # noqa: E402
+from app.utils.timezone import get_naive_now  # noqa: E402
+
+ENDPOINTS = [
+    ('attendance list', '/api/attendance/?limit=100'),
+    ('attendance export', '/api/attendance/?stream=true'),
+    ('attendance stats', '/api/attendance/stats?breakdown=day,class'),
+    ('student list', '/api/students/'),
+    ('student page', '/api/students/?limit=100'),
+    ('class list', '/api/classes/'),
+    ('class page', '/api/classes/?limit=100'),
+    ('class attendance report', '/api/classes/1/attendance-report'),
+    ('device list', '/api/device/list'),
+    ('device status', '/api/device/status'),
+    ('recent attendance', '/api/recent-attendance?last_id=0'),
+    ('dashboard', '/'),
+    ('students page', '/students'),
+    ('classes page', '/classes'),
+    ('attendance page', '/attendance'),
+    ('devices page', '/devices'),
+    ('class report page', '/reports/class/1'),
+]
+
+
+def seed(scale):
+    """``scale`` times a small school: classes with schedules, students, devices, today's scans"""
+    now = get_naive_now()
+    today = now.strftime('%A').lower()
+
+    classes = []
+    for c in range(3 * scale):
+        class_obj = Class(name=f'Class {c + 1}', code=f'C{c + 1}', is_active=True)
+        db.session.add(class_obj)
+        db.session.flush()
+        for day in (today, 'saturday' if today != 'saturday' else 'sunday'):
+            db.session.add(ClassSchedule(class_id=class_obj.id, day_of_week=day,
+                                         start_time=now.replace(hour=0, minute=0).time(),
+                                         end_time=now.replace(hour=23, minute=59).time()))
+        classes.append(class_obj)
+
+    for d in range(2 * scale):
+        db.session.add(Device(device_id=f'DEV-{d + 1}', name=f'Device {d + 1}', mode='attendance',
+                              current_class_id=classes[d % len(classes)].id, last_seen=now))
+
+    students = 10 * scale
+    for s in range(students):
+        db.session.add(Student(name=f'Student {s + 1}', fingerprint_id=s + 1,
+                               student_id=f'S{s + 1:04d}', class_id=classes[s % len(classes)].id))
+    db.session.commit()
+
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    bulk_insert(Attendance, [{
+        'student_id': s % students + 1,
+        # Every fifth scan outside any class, as manual marks and verify scans without a class write
+        'class_id': classes[s % len(classes)].id if s % 5 else None,
+        'device_id': f'DEV-{s % (2 * scale) + 1}',
+        'status': 'present',
+        'timestamp': start + timedelta(seconds=s),
+        'entry_time': start + timedelta(seconds=s)
+    } for s in range(25 * scale)])
+    db.session.commit()
+
+
+def count_queries(scale):
+    """{label: number of statements} for every endpoint against a database of ``scale``"""
+    app = create_app('testing')
+    client = app.test_client()
+    counts = {}
+
+    with app.app_context():
+        seed(scale)
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+    for label, url in ENDPOINTS:
+        # Start every request cold so cached counts / schedules don't hide queries
+        invalidate_stats_cache()
+        invalidate_schedule_cache()
+        statements.clear()
+        response = client.get(url)
+        response.get_data()  # Streamed bodies run their queries as they are read
+        if response.status_code != 200:
+            raise SystemExit(f"{label}: HTTP {response.status_code}")
+        counts[label] = (len(statements), list(statements))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that list endpoints issue a constant number of queries')
+    parser.add_argument('--scale', type=int, default=4, help='Size of the larger database relative to the smaller')
+    parser.add_argument('--verbose', action='store_true', help='Print the statements of failing endpoints')
+    args = parser.parse_args()
+
+    small = count_queries(1)
+    large = count_queries(args.scale)
+
+    failures = 0
+    for label, _ in ENDPOINTS:
+        (few, _), (many, statements) = small[label], large[label]
+        if few == many:
+            print(f"✓ {label}: {few} queries")
+            continue
+        failures += 1
+        print(f"✗ {label}: {few} queries at 1x, {many} at {args.scale}x")
+        if args.verbose:
+            for statement in dict.fromkeys(statements):
+                print('   ' + ' '.join(statement.split())[:160])
+
+    print(f"\nChecked {len(ENDPOINTS)} endpoints: {failures} with per-row queries")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Attendance query-plan regression check
+
+Seeds an in-memory SQLite database with a realistic attendance history,
+exercises every endpoint that reads the attendance table and runs
+EXPLAIN QUERY PLAN on each SQL statement they issue. Any statement that
+falls back to a full table scan of attendance (``SCAN attendance`` without
+``USING INDEX``) fails the check, so a dropped index or a rewritten filter
+that no longer matches one is caught before it reaches a large database.
+
+Usage:
+    python check_query_plans.py
+    python check_query_plans.py --rows 50000 --verbose
+
+Exits with status 1 if any statement regresses.
+"""
+import argparse
+import random
+import re
+import sys
+from datetime import timedelta
+from sqlalchemy import event
+from config import TestingConfig
+
+TestingConfig.SQLALCHEMY_DATABASE_URI = 'sqlite://'
+TestingConfig.MATCHER_SNAPSHOT_PATH = ''
+
+from app import create_app, db  # noqa: E402
+from app.models import Attendance, Class, ClassSchedule, Student  # noqa: E402
+from app.utils.bulk import bulk_insert  # noqa: E402
+from app.utils.timezone import get_naive_now  # noqa: E402
+
+READS_ATTENDANCE = re.compile(r'\b(FROM|JOIN)\s+attendance\b', re.IGNORECASE)
+FULL_SCAN = re.compile(r'^SCAN attendance\b(?!.*\bUSING\b)')
+
+
+def seed(rows, classes, students, days):
+    """Classes running all day today, enrolled students and ``rows`` attendance records"""
+    now = get_naive_now()
+    today = now.strftime('%A').lower()
+    rng = random.Random(0)
+
+    class_ids = []
+    for c in range(classes):
+        class_obj = Class(name=f'Class {c + 1}', code=f'C{c + 1}', is_active=True)
+        db.session.add(class_obj)
+        db.session.flush()
+        db.session.add(ClassSchedule(class_id=class_obj.id, day_of_week=today,
+                                     start_time=now.replace(hour=0, minute=0, second=0, microsecond=0).time(),
+                                     end_time=now.replace(hour=23, minute=59, second=0, microsecond=0).time()))
+        class_ids.append(class_obj.id)
+
+    for s in range(students):
+        db.session.add(Student(name=f'Student {s + 1}', fingerprint_id=s + 1,
+                               class_id=class_ids[s % classes],
+                               fingerprint_template=rng.randbytes(512)))
+    db.session.commit()
+
+    records = []
+    for _ in range(rows):
+        entry = now - timedelta(days=rng.randrange(1, days), minutes=rng.randrange(600))
+        records.append({
+            'student_id': rng.randrange(1, students + 1),
+            'class_id': rng.choice(class_ids),
+            'device_id': 'ESP32-01',
+            'status': rng.choice(['present', 'present', 'late', 'absent']),
+            'timestamp': entry,
+            'entry_time': entry,
+            'exit_time': entry + timedelta(minutes=60),
+            'duration_minutes': 60
+        })
+    bulk_insert(Attendance, records)
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def requests_to_check(client):
+    """(label, callable) pairs covering every attendance read path"""
+    today = get_naive_now().strftime('%Y-%m-%d')
+    with client.application.app_context():
+        template = db.session.get(Student, 1).fingerprint_template.hex()
+
+    def first_page_cursor(url):
+        return client.get(url).get_json()['next_cursor']
+
+    def read_stream(response):
+        response.get_data()  # Streamed bodies run their queries as they are read
+        return response
+
+    return [
+        ('verify scan', lambda: client.post('/api/attendance/verify', json={'template': template})),
+        ('buffered scan batch', lambda: client.post('/api/attendance/batch', json={'scans': [
+            {'fingerprint_id': s, 'age_seconds': 600 - s} for s in range(2, 42)
+        ]})),
+        ('list by student', lambda: client.get('/api/attendance/?student_id=1')),
+        ('list by class', lambda: client.get('/api/attendance/?class_id=1')),
+        ('list by date', lambda: client.get(f'/api/attendance/?date={today}')),
+        ('list by class and date', lambda: client.get(f'/api/attendance/?class_id=1&date={today}')),
+        ('list next page', lambda: client.get('/api/attendance/?limit=50&cursor=' + first_page_cursor('/api/attendance/?limit=50'))),
+        ('list next page by class', lambda: client.get(
+            '/api/attendance/?class_id=1&limit=50&cursor=' + first_page_cursor('/api/attendance/?class_id=1&limit=50'))),
+        ('list export by class', lambda: read_stream(client.get('/api/attendance/?class_id=1&stream=true'))),
+        ('stats by class and date', lambda: client.get(f'/api/attendance/stats?class_id=1&date={today}')),
+        ('stats by date', lambda: client.get(f'/api/attendance/stats?date={today}')),
+        ('dashboard', lambda: client.get('/')),
+        ('recent attendance', lambda: client.get('/api/recent-attendance?last_id=1')),
+        ('attendance page by class', lambda: client.get('/attendance?class_id=1')),
+        ('attendance page by date', lambda: client.get(f'/attendance?date={today}')),
+        ('attendance page by student', lambda: client.get('/attendance?student_id=1')),
+        ('reports', lambda: client.get('/reports')),
+        ('reports by class', lambda: client.get('/reports?class_id=1')),
+        ('class attendance report', lambda: client.get('/reports/class/1')),
+        ('class attendance report API', lambda: client.get('/api/classes/1/attendance-report')),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check attendance queries for full table scans')
+    parser.add_argument('--rows', type=int, default=20000, help='Seeded attendance records')
+    parser.add_argument('--classes', type=int, default=5)
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--days', type=int, default=60, help='History spread over this many days')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan, not just failures')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    client = app.test_client()
+
+    with app.app_context():
+        seed(args.rows, args.classes, args.students, args.days)
+
+        captured = []
+        capturing = [True]
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if capturing[0] and statement.lstrip().upper().startswith('SELECT') \
+                    and READS_ATTENDANCE.search(statement):
+                captured.append((statement, tuple(parameters) if parameters else ()))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+
+    failures = 0
+    checked = 0
+    for label, call in requests_to_check(client):
+        captured.clear()
+        capturing[0] = True
+        response = call()
+        capturing[0] = False
+        if response.status_code >= 500:
+            print(f"✗ {label}: HTTP {response.status_code}")
+            failures += 1
+            continue
+
+        statements = list(dict.fromkeys(captured))
+        if not statements:
+            print(f"- {label}: no attendance queries")
+            continue
+
+        regressed = 0
+        with app.app_context(), db.engine.connect() as conn:
+            for statement, parameters in statements:
+                plan = [row[3] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+                bad = any(FULL_SCAN.search(step) for step in plan)
+                checked += 1
+                regressed += bad
+                if bad or args.verbose:
+                    print(f"{'✗' if bad else '✓'} {label}: {'full scan of attendance' if bad else 'ok'}")
+                    print('   ' + ' '.join(statement.split()))
+                    for step in plan:
+                        print(f"     {step}")
+        failures += regressed
+        if not regressed and not args.verbose:
+            print(f"✓ {label} ({len(statements)} queries)")
+
+    print(f"\nChecked {checked} attendance queries: {failures} regression(s)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,18 +4,115 @@ Application Configuration
 import os
 from datetime import timedelta
 
+try:
+    from dotenv import load_dotenv
+    load_dotenv()  # DATABASE_URL, SECRET_KEY, ... from .env (see .env.example)
+except ImportError:
+    pass
+
+
+def database_url(url):
+    """Normalise a DATABASE_URL for SQLAlchemy
+
+    postgres:// (Heroku/Render style) and bare postgresql:// URLs use the
+    psycopg 3 driver; SQLite and URLs naming a driver are left as they are.
+    """
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    if url.startswith('postgresql://'):
+        url = 'postgresql+psycopg://' + url[len('postgresql://'):]
+    return url
+
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///fingerprint_attendance.db'
+    SQLALCHEMY_DATABASE_URI = database_url(os.environ.get('DATABASE_URL') or 'sqlite:///fingerprint_attendance.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Engine options per backend, merged into SQLALCHEMY_ENGINE_OPTIONS for the
+    # dialect of SQLALCHEMY_DATABASE_URI (see app/utils/database.py)
+    SQLITE_ENGINE_OPTIONS = {}
+    POSTGRES_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),  # ~ request threads per worker
+        'max_overflow': 10,
+        'pool_timeout': 10,
+        'pool_pre_ping': True,  # Survive server restarts / idle disconnects
+        'pool_recycle': 1800,
+        'connect_args': {
+            'connect_timeout': 10,
+            'application_name': 'fingerprint-attendance',
+            'options': '-c statement_timeout=30000'  # ms; no request should hold a connection longer
+        }
+    }
+    # Behind PgBouncer (transaction pooling) the server-side pooler owns the
+    # connections: no client pool and no prepared statements
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '').lower() in ('1', 'true', 'yes')
+    
+    # PRAGMAs applied to every new SQLite connection (see app/utils/sqlite_tuning.py)
+    SQLITE_PRAGMAS = {}
+    
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_TYPE = 'filesystem'
     
     # Device configuration
     DEVICE_POLL_TIMEOUT = 300  # 5 minutes
+    # Longest a device long-poll ('wait') is held; keep it under the 30 s online window
+    DEVICE_LONG_POLL_SECONDS = 20
+    # Device heartbeats are kept in memory and written to devices.last_seen in one
+    # batch at most this often (status pages read the in-memory value directly)
+    HEARTBEAT_FLUSH_SECONDS = 10
+    
+    # Longest the session-end absence job sleeps between passes (it also wakes at
+    # each session's end time); 0 disables it. See app/utils/absences.py
+    ABSENCE_JOB_SECONDS = 60
+    
+    # Most buffered scans accepted in one POST /api/attendance/batch
+    ATTENDANCE_BATCH_MAX_SCANS = 500
+    
+    # Largest ``limit`` accepted by paged list endpoints (use stream=true for full exports)
+    API_MAX_PAGE_SIZE = 1000
+    
+    # Server-Sent Events (/api/events/stream)
+    SSE_KEEPALIVE_SECONDS = 15  # Comment frame on idle streams so proxies keep them open
+    SSE_STREAM_SECONDS = 300  # Close and let EventSource reconnect (resumes via Last-Event-ID)
+    # Streams allowed at once when not running under gevent, where each one holds a
+    # server thread; beyond this the stream answers 503 and dashboards poll instead
+    SSE_THREADED_STREAMS = int(os.environ.get('SSE_THREADED_STREAMS', 0))
+    
+    # Seconds a worker may serve its cached class schedule before reloading
+    # (write routes invalidate it immediately in the same process)
+    SCHEDULE_CACHE_TTL = 60
+    
+    # Seconds a worker may serve cached sidebar/dashboard counts (this process's
+    # own writes invalidate them immediately)
+    STATS_CACHE_TTL = 30
+    
+    # Seconds a worker may decide entry/exit/cooldown from its cached per-student
+    # attendance state before re-reading it (0 = always read from the database)
+    ATTENDANCE_STATE_TTL = 60
+    
+    # Fingerprint matching configuration (see app/matching)
+    MATCHER_BACKEND = os.environ.get('MATCHER_BACKEND', 'byte_equality')
+    MATCH_THRESHOLD = 40  # Minimum score (percent) to accept a match
+    MATCH_TOP_K = 3  # Candidates ranked per 1:N scan
+    MATCH_AMBIGUITY_MARGIN = 5  # Reject when the runner-up scores within this many points of the best
+    # Return the ranked candidates (student IDs and scores) in verify responses; for tuning only
+    MATCH_DEBUG_CANDIDATES = os.environ.get('MATCH_DEBUG_CANDIDATES', '').lower() in ('1', 'true', 'yes')
+    MATCHER_OPTIONS = {
+        'workers': int(os.environ.get('MATCHER_WORKERS', 0)),  # Process pool size for 1:N scans (0 = in-request)
+        'parallel_min_gallery': 20000,  # Only fan out above this many enrolled templates
+        # Candidate pre-filter: more/narrower bands = higher recall, fewer/wider = smaller candidate sets
+        'prefilter_bands': int(os.environ.get('MATCHER_PREFILTER_BANDS', 0)),  # 0 = score every template
+        'prefilter_band_width': 2
+    }
+    # Memory-mapped gallery snapshot for fast warm starts (relative to the instance folder,
+    # '' disables). Unset: beside the SQLite database file / named after the database URL
+    MATCHER_SNAPSHOT_PATH = os.environ.get('MATCHER_SNAPSHOT_PATH')
+    # Seconds between checks that the loaded gallery still matches the students table,
+    # which other worker processes also change (0 = check on every scan)
+    MATCHER_STALE_CHECK_SECONDS = float(os.environ.get('MATCHER_STALE_CHECK_SECONDS', 2))
     
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -26,11 +123,30 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     TESTING = False
+    
+    # Concurrent scans + dashboard polling: WAL so readers don't wait on writers,
+    # and a busy timeout so concurrent writers queue instead of failing
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # Durable at checkpoints; safe with WAL
+        'busy_timeout': 5000,  # ms to wait for the write lock
+        'mmap_size': 268435456,  # 256 MB memory-mapped reads
+        'cache_size': -65536,  # 64 MB page cache per connection
+        'temp_store': 'MEMORY'
+    }
+    SQLITE_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),  # ~ request threads per worker
+        'max_overflow': 10,
+        'pool_timeout': 10,
+        'pool_recycle': 3600,
+        'connect_args': {'timeout': 5}  # Driver-level lock wait (seconds), matches busy_timeout
+    }
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///test_attendance.db'
+    # Point at an ephemeral PostgreSQL to run the checks against the production backend
+    SQLALCHEMY_DATABASE_URI = database_url(os.environ.get('TEST_DATABASE_URL') or 'sqlite:///test_attendance.db')
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,138 @@
+"""
+SQLite load test: default settings vs the production profile
+
+Starts several writer processes (each one committing attendance rows like a
+fingerprint scan) and reader processes (dashboard-style count + recent
+activity queries) against a fresh SQLite file, once per profile, and reports
+write throughput, "database is locked" errors and read latency.
+
+    default      Config: rollback journal, no busy timeout, default pool
+    production   ProductionConfig: SQLITE_PRAGMAS + SQLALCHEMY_ENGINE_OPTIONS
+
+Usage:
+    python load_test_sqlite.py
+    python load_test_sqlite.py --writers 8 --readers 8 --seconds 15
+    python load_test_sqlite.py --profile production
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+from sqlalchemy.exc import OperationalError
+
+
+def make_config(profile, path):
+    from config import Config, ProductionConfig
+
+    base = ProductionConfig if profile == 'production' else Config
+    return type(f'{profile.title()}LoadTestConfig', (base,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'MATCHER_SNAPSHOT_PATH': '',
+        'DEBUG': False
+    })
+
+
+def open_app(profile, path):
+    from config import config
+    from app import create_app
+
+    config['loadtest'] = make_config(profile, path)
+    return create_app('loadtest')
+
+
+def writer(profile, path, seconds, results, worker):
+    from app import db
+    from app.models import Attendance
+    from app.utils.timezone import get_naive_now
+
+    app = open_app(profile, path)
+    writes = errors = 0
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            now = get_naive_now()
+            try:
+                db.session.add(Attendance(student_id=worker + 1, class_id=1, device_id='ESP32-01',
+                                          status='present', timestamp=now, entry_time=now))
+                db.session.commit()
+                writes += 1
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+    results.put(('write', writes, errors, []))
+
+
+def reader(profile, path, seconds, results, worker):
+    from app import db
+    from app.models import Attendance
+    from app.utils.timezone import get_today_start
+
+    app = open_app(profile, path)
+    latencies = []
+    errors = 0
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                Attendance.query.filter(Attendance.timestamp >= get_today_start()).count()
+                Attendance.query.order_by(Attendance.timestamp.desc()).limit(10).all()
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                errors += 1
+            db.session.remove()
+    results.put(('read', len(latencies), errors, latencies))
+
+
+def run(profile, writers, readers, seconds):
+    directory = tempfile.mkdtemp(prefix='loadtest_')
+    path = os.path.join(directory, 'attendance.db')
+    open_app(profile, path)  # Create the schema before the clock starts
+
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=writer, args=(profile, path, seconds, results, i))
+                 for i in range(writers)]
+    processes += [multiprocessing.Process(target=reader, args=(profile, path, seconds, results, i))
+                  for i in range(readers)]
+    for process in processes:
+        process.start()
+
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    writes = sum(r[1] for r in collected if r[0] == 'write')
+    write_errors = sum(r[2] for r in collected if r[0] == 'write')
+    read_errors = sum(r[2] for r in collected if r[0] == 'read')
+    latencies = np.array([l for r in collected if r[0] == 'read' for l in r[3]] or [0.0])
+    return {
+        'writes_per_sec': writes / seconds,
+        'write_errors': write_errors,
+        'reads': int(sum(r[1] for r in collected if r[0] == 'read')),
+        'read_errors': read_errors,
+        'read_p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'read_p99_ms': float(np.percentile(latencies, 99) * 1000)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite concurrency load test')
+    parser.add_argument('--profile', choices=['default', 'production', 'both'], default='both')
+    parser.add_argument('--writers', type=int, default=4, help='Writer processes')
+    parser.add_argument('--readers', type=int, default=4, help='Reader processes')
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    profiles = ['default', 'production'] if args.profile == 'both' else [args.profile]
+    print(f"{'profile':>10} {'writes/s':>10} {'w-errors':>9} {'reads':>8} {'r-errors':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8}")
+    for profile in profiles:
+        r = run(profile, args.writers, args.readers, args.seconds)
+        print(f"{profile:>10} {r['writes_per_sec']:>10.1f} {r['write_errors']:>9} {r['reads']:>8} "
+              f"{r['read_errors']:>9} {r['read_p50_ms']:>8.2f} {r['read_p99_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Rebuild the daily attendance summary from the attendance table
+
+The summary (daily_attendance_summary) is kept up to date as attendance is
+written and is backfilled once by schema migration 5. Run this to repair it
+after editing attendance rows by hand (SQL console, restored backup) or to
+recompute a date range.
+
+Usage:
+    python rebuild_daily_summary.py                              # whole table
+    python rebuild_daily_summary.py --from 2025-11-01 --to 2025-11-30
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+from app import create_app, db
+from config import config
+from app.utils.daily_summary import rebuild_daily_summary
+
+
+def parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild daily_attendance_summary from attendance')
+    parser.add_argument('--from', dest='start', type=parse_day, help='First day to rebuild (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', type=parse_day, help='Last day to rebuild, inclusive (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    app = create_app(os.environ.get('FLASK_ENV') if os.environ.get('FLASK_ENV') in config else 'default')
+    with app.app_context():
+        end = args.end + timedelta(days=1) if args.end else None
+        with db.engine.begin() as conn:
+            rows = rebuild_daily_summary(conn, args.start, end)
+        print(f"✓ Rebuilt {rows} summary rows"
+              + (f" from {args.start or 'the beginning'} to {args.end or 'today'}" if args.start or args.end else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -31,6 +31,23 @@ byte lcdAddress = 0x27;
 // ================== DEVICE CONFIGURATION ==================
 const char* DEVICE_ID = "ESP32-01"; // Unique device identifier
 
+// ================== OFFLINE SCAN BUFFER ==================
+// Scans taken while WiFi or the server is unreachable are kept here (in RAM,
+// lost on power-off) and uploaded together to /api/attendance/batch once the
+// connection is back. The ESP32 has no real-time clock, so each scan keeps
+// millis() and is sent as its age in seconds.
+struct BufferedScan {
+  uint8_t fingerprintId;
+  uint16_t confidence;
+  unsigned long scannedAt;  // millis() at the scan
+};
+const int OFFLINE_BUFFER_SIZE = 200;
+BufferedScan offlineScans[OFFLINE_BUFFER_SIZE];
+int offlineScanCount = 0;
+
+unsigned long wifiLostAt = 0;  // millis() when WiFi dropped (0 = connected)
+const unsigned long WIFI_RESTART_AFTER = 600000;  // Restart after 10 min offline, only with nothing buffered
+
 // ================== DEBUG MACROS ==================
 #define DEBUG_PRINT(...)   Serial.print(__VA_ARGS__)
 #define DEBUG_PRINTLN(...) Serial.println(__VA_ARGS__)
@@ -208,29 +225,103 @@ void setupWiFi() {
 
 bool ensureWiFiConnection() {
   if (WiFi.status() == WL_CONNECTED) {
+    wifiLostAt = 0;
     return true;
   }
   
-  DEBUG_PRINTLN("WiFi disconnected! Reconnecting...");
-  showLCD("WiFi Lost", "Reconnecting...");
+  if (wifiLostAt == 0) {
+    // Just dropped: wait up to 10 seconds for it to come back
+    wifiLostAt = millis();
+    DEBUG_PRINTLN("WiFi disconnected! Reconnecting...");
+    showLCD("WiFi Lost", "Reconnecting...");
+    
+    int attempts = 0;
+    while (WiFi.status() != WL_CONNECTED && attempts < 20) {
+      delay(500);
+      attempts++;
+    }
+    
+    if (WiFi.status() == WL_CONNECTED) {
+      wifiLostAt = 0;
+      DEBUG_PRINTLN("WiFi reconnected!");
+      showLCD("WiFi OK", WiFi.localIP().toString());
+      delay(1000);
+      return true;
+    }
+    
+    DEBUG_PRINTLN("WiFi reconnection failed, scans will be buffered offline");
+    return false;
+  }
   
-  int attempts = 0;
-  while (WiFi.status() != WL_CONNECTED && attempts < 20) {
-    delay(500);
-    attempts++;
+  // Already offline: don't block scanning while the WiFi stack keeps retrying.
+  // Restarting would lose buffered scans, so only restart with none pending.
+  if (offlineScanCount == 0 && millis() - wifiLostAt >= WIFI_RESTART_AFTER) {
+    DEBUG_PRINTLN("WiFi offline too long, restarting ESP32...");
+    showLCD("WiFi Failed", "Restarting...");
+    delay(2000);
+    ESP.restart();
+  }
+  return false;
+}
+
+// ================== OFFLINE SCAN BUFFER FUNCTIONS ==================
+bool bufferOfflineScan(uint8_t fingerprintId, uint16_t confidence) {
+  if (offlineScanCount >= OFFLINE_BUFFER_SIZE) {
+    DEBUG_PRINTLN("Offline buffer full, scan dropped");
+    showLCD("Offline, full", "Scan not saved");
+    return false;
   }
   
-  if (WiFi.status() == WL_CONNECTED) {
-    DEBUG_PRINTLN("WiFi reconnected!");
-    showLCD("WiFi OK", WiFi.localIP().toString());
+  offlineScans[offlineScanCount].fingerprintId = fingerprintId;
+  offlineScans[offlineScanCount].confidence = confidence;
+  offlineScans[offlineScanCount].scannedAt = millis();
+  offlineScanCount++;
+  
+  DEBUG_PRINTLN("Scan buffered offline (" + String(offlineScanCount) + " pending)");
+  showLCD("Saved offline", String(offlineScanCount) + " pending");
+  indicateSuccess();
+  delay(1500);
+  return true;
+}
+
+// Upload every buffered scan in one request; the buffer is cleared once the server answers
+bool flushOfflineScans() {
+  if (offlineScanCount == 0) return true;
+  if (WiFi.status() != WL_CONNECTED) return false;
+  
+  unsigned long now = millis();
+  String payload = "{\"device_id\":\"" + String(DEVICE_ID) + "\",\"scans\":[";
+  for (int i = 0; i < offlineScanCount; i++) {
+    if (i > 0) payload += ",";
+    payload += "{\"fingerprint_id\":" + String(offlineScans[i].fingerprintId) +
+               ",\"confidence\":" + String(offlineScans[i].confidence) +
+               ",\"age_seconds\":" + String((now - offlineScans[i].scannedAt) / 1000.0, 1) + "}";
+  }
+  payload += "]}";
+  
+  HTTPClient http;
+  String url = String(serverURL) + "/api/attendance/batch";
+  
+  http.begin(url);
+  http.setTimeout(15000);
+  http.addHeader("Content-Type", "application/json");
+  
+  DEBUG_PRINTLN("Uploading " + String(offlineScanCount) + " offline scan(s)");
+  int httpCode = http.POST(payload);
+  
+  if (httpCode == 200) {
+    // Per-scan results (entry / exit / cooldown / error) are in the response
+    String response = http.getString();
+    http.end();
+    DEBUG_PRINTLN("Offline scans uploaded: " + response.substring(0, min(200, (int)response.length())));
+    showLCD("Synced " + String(offlineScanCount), "offline scans");
+    offlineScanCount = 0;
     delay(1000);
     return true;
   }
   
-  DEBUG_PRINTLN("WiFi reconnection failed, restarting ESP32...");
-  showLCD("WiFi Failed", "Restarting...");
-  delay(2000);
-  ESP.restart();
+  DEBUG_PRINTLN("Offline upload failed: " + String(httpCode));
+  http.end();
   return false;
 }
 
@@ -420,8 +511,12 @@ bool scanAndSendFingerprint() {
 
 bool sendFingerprintToServer(uint8_t fingerprintId, uint16_t confidence) {
   if (!ensureWiFiConnection()) {
-    showLCD("WiFi Error", "Check connection");
-    return false;
+    return bufferOfflineScan(fingerprintId, confidence);
+  }
+  
+  // Buffered scans are older: upload them first so the server sees scans in order
+  if (offlineScanCount > 0) {
+    flushOfflineScans();
   }
   
   HTTPClient http;
@@ -439,6 +534,13 @@ bool sendFingerprintToServer(uint8_t fingerprintId, uint16_t confidence) {
   
   int httpCode = http.POST(payload);
   
+  if (httpCode <= 0) {
+    // Server unreachable (connection refused / timeout): keep the scan for later
+    DEBUG_PRINTLN("HTTP client error code: " + String(httpCode));
+    http.end();
+    return bufferOfflineScan(fingerprintId, confidence);
+  }
+  
   if (httpCode == 200 || httpCode == 201) {
     String response = http.getString();
     http.end();
@@ -875,6 +977,7 @@ String currentClassName = "";  // Current class name
 int currentClassTimeRemaining = 0;  // Minutes remaining in current class
 unsigned long lastModeCheck = 0;
 const unsigned long MODE_CHECK_INTERVAL = 5000; // Check mode every 5 seconds
+const int COMMAND_LONG_POLL_SECONDS = 20; // Enrollment mode: wait server-side for commands
 
 // Global variable to store template during enrollment
 String lastEnrollmentTemplate = "";
@@ -999,10 +1102,12 @@ bool pollForCommands() {
   String url = String(serverURL) + "/api/device/poll";
   
   http.begin(url);
-  http.setTimeout(5000);
+  // Long-poll: the server holds the request until a command arrives or the
+  // mode changes, or COMMAND_LONG_POLL_SECONDS pass
+  http.setTimeout((COMMAND_LONG_POLL_SECONDS + 5) * 1000);
   http.addHeader("Content-Type", "application/json");
   
-  String payload = "{\"device_id\":\"" + String(DEVICE_ID) + "\"}";
+  String payload = "{\"device_id\":\"" + String(DEVICE_ID) + "\",\"wait\":" + String(COMMAND_LONG_POLL_SECONDS) + "}";
   
   int httpCode = http.POST(payload);
   
@@ -1465,7 +1570,10 @@ void loop() {
     lastWiFiCheck = millis();
     if (WiFi.status() != WL_CONNECTED) {
       DEBUG_PRINTLN("WiFi health check failed, reconnecting...");
+      WiFi.reconnect();
       ensureWiFiConnection();
+    } else if (offlineScanCount > 0) {
+      flushOfflineScans();
     }
   }
 }